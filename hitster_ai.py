@@ -0,0 +1,210 @@
+# --- 3/B. AI PAKLI DÚSÍTÁS (Groq évszám ellenőrzés, kötegelve, háttérben) ---
+# Egy kérés sok dalt ellenőriz, több kérés fut párhuzamosan egy worker poolon;
+# az eredmény az update_state-en keresztül íródik vissza a tárolt pakliba.
+import importlib.util
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import hitster_cache
+import hitster_catalog
+import hitster_clients
+import hitster_db
+import hitster_metrics
+
+log = logging.getLogger(__name__)
+
+GROQ_MODEL = "llama-3.3-70b-versatile"
+YEAR_BATCH_SIZE = 20  # dal / kérés
+AI_MAX_WORKERS = 4    # egyszerre futó kérések
+
+PREFETCH_AHEAD = 2     # a rejtélyes dalon kívül ennyi következő kártya fun factjét melegítjük
+PREFETCH_WORKERS = 2   # külön pool, hogy a pakli dúsítás ne tartsa fel
+
+_executor = ThreadPoolExecutor(max_workers=AI_MAX_WORKERS, thread_name_prefix="hitster-ai")
+_fact_executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="hitster-fact")
+_fact_lock = threading.Lock()
+_fact_futures = {}  # cache_key -> Future (folyamatban lévő / kész előtöltések)
+_status_lock = threading.Lock()
+# a groq csomag csak az első AI hívásnál töltődik be (a telefonok munkamenetének nem kell);
+# a kliens kulcsonként közös (hitster_clients), a kérések a "groq" párhuzamossági korlát alatt futnak
+GROQ_AVAILABLE = importlib.util.find_spec("groq") is not None
+_enrich_status = {}  # room_id -> {"total", "done", "failed", "started"}
+
+def song_key(card):
+    return card.get('spotify_id') or f"{card['artist']}|{card['title']}".lower()
+
+def _valid_year(value):
+    try: year = int(str(value).strip()[:4])
+    except (TypeError, ValueError): return None
+    return year if 1900 < year <= time.localtime().tm_year else None
+
+def verify_years(cards, api_key):
+    # {song_key: év}: előbb a tartós cache, a maradékra egyetlen Groq kérés; hibánál csak a cache találatok
+    if not cards: return {}
+    cached = hitster_cache.get_years(cards)
+    years = {song_key(c): cached[hitster_cache.cache_key(c['artist'], c['title'])]
+             for c in cards if hitster_cache.cache_key(c['artist'], c['title']) in cached}
+    missing = [c for c in cards if song_key(c) not in years]
+    if missing and api_key and GROQ_AVAILABLE:
+        fetched = _fetch_years(missing, api_key)
+        if fetched is None: return years
+        # csak a ténylegesen visszakapott évek számítanak ellenőrzöttnek: a kihagyott / érvénytelen válaszú dal
+        # nem kerül a cache-be és nem kap ai_checked jelet, így egy későbbi köteggel újra próbálkozunk
+        hitster_cache.put_years(missing, {hitster_cache.cache_key(c['artist'], c['title']): fetched[song_key(c)]
+                                          for c in missing if song_key(c) in fetched})
+        years.update(fetched)
+    return years
+
+def _fetch_years(cards, api_key):
+    lines = "\n".join(f"{i + 1}. '{c['title']}' by '{c['artist']}'" for i, c in enumerate(cards))
+    prompt = ("Fact Check: ORIGINAL release year of each song below. Reply ONLY with a JSON object "
+              "mapping each number to a 4-digit year, e.g. {\"1\": 1984}.\n" + lines)
+    def ask():
+        with hitster_clients.upstream("groq"), hitster_metrics.timer("groq.request", kind="years"):
+            return hitster_clients.groq_client(api_key).chat.completions.create(
+                model=GROQ_MODEL, messages=[{"role": "user", "content": prompt}], temperature=0,
+                max_tokens=12 * len(cards) + 20, response_format={"type": "json_object"})
+    try:
+        completion = hitster_clients.single_flight(("groq", "years") + tuple(song_key(c) for c in cards), ask)
+        answer = json.loads(completion.choices[0].message.content)
+    except Exception as e:
+        log.warning("Groq year batch failed (%d songs): %s", len(cards), e)
+        hitster_metrics.inc("groq_errors", kind="years")
+        return None
+    years = {}
+    for i, c in enumerate(cards):
+        year = _valid_year(answer.get(str(i + 1)))
+        if year: years[song_key(c)] = year
+    return years
+
+def get_fun_fact_cached(artist, title, api_key):
+    fact = hitster_cache.get_fun_fact(artist, title, want=hitster_cache.FUN_FACTS_PER_SONG if api_key else 1)
+    if fact: return fact
+    if not api_key or not GROQ_AVAILABLE: return "Jó kis zene!"
+    # az egyszerre ugyanarra a dalra érkező hívások (pl. előtöltés + felfedés) egy kérésen osztoznak
+    try: fact = hitster_clients.single_flight(("groq", "fun_fact", hitster_cache.cache_key(artist, title)),
+                                              lambda: _ask_fun_fact(artist, title, api_key))
+    except Exception as e:
+        log.warning("Groq fun fact failed: %s", e)
+        hitster_metrics.inc("groq_errors", kind="fun_fact")
+        return "Szuper sláger!"
+    return fact or "Szuper sláger!"
+
+def _ask_fun_fact(artist, title, api_key):
+    prompt = f"Tell me a very short (max 1 sentence), interesting trivia fact about the song '{title}' by '{artist}' in HUNGARIAN language. Don't mention the release year."
+    with hitster_clients.upstream("groq"), hitster_metrics.timer("groq.request", kind="fun_fact"):
+        completion = hitster_clients.groq_client(api_key).chat.completions.create(
+            model=GROQ_MODEL, messages=[{"role": "user", "content": prompt}], temperature=0.7, max_tokens=100)
+    fact = completion.choices[0].message.content.strip()
+    if fact: hitster_cache.put_fun_fact(artist, title, fact)
+    return fact
+
+def apply_years(cards, years):
+    # helyben javítja a kártyákat; True, ha bármelyik megváltozott
+    changed = False
+    for card in cards:
+        if card is None or card.get('ai_checked') or song_key(card) not in years: continue
+        new_year = years[song_key(card)]
+        if new_year != card['year']:
+            card['year'] = new_year
+            card['fixed_by_ai'] = True
+        card['ai_checked'] = True
+        changed = True
+    return changed
+
+def check_cards(cards, api_key):
+    # ellenőrzés + javítás helyben + visszaírás a katalógusba (a pakli id-i onnan kapják a javított évet)
+    years = verify_years(cards, api_key)
+    if years and apply_years(cards, years): hitster_catalog.store_years(cards)
+    return years
+
+def _enrich_batch(room_id, batch, api_key):
+    years = check_cards(batch, api_key)
+    def patch(s):
+        # a rejtélyes dalt csak tippelés előtt javítjuk, a már lerakott kártyákhoz nem nyúlunk;
+        # az id-s pakli a katalógusból már a javított évet húzza, csak a régi, kártyás paklit kell foltozni
+        cards = [c for c in s.get('deck', []) if isinstance(c, dict)]
+        if s.get('game_phase') == "GUESSING": cards.append(s.get('current_mystery_song'))
+        return apply_years(cards, years)
+    if years: hitster_db.update_state(room_id, patch, bump_version=False, event="cards_checked")
+    with _status_lock:
+        status = _enrich_status.get(room_id)
+        if status:
+            status["done"] += len(batch)
+            status["failed"] += sum(1 for c in batch if song_key(c) not in years)  # ezek egy későbbi kötegben jönnek újra
+
+def enrich_deck_async(room_id, deck, api_key, batch_size=YEAR_BATCH_SIZE):
+    # A pakli végéről húzunk (pop), ezért a végéről indulva kötegelünk: a következő körök kártyái készülnek el először
+    todo = [dict(c) for c in reversed(deck) if not c.get('ai_checked')]
+    if not api_key or not GROQ_AVAILABLE or not todo: return 0
+    with _status_lock:
+        status = _enrich_status.get(room_id)
+        if status and status["done"] < status["total"]: status["total"] += len(todo)
+        else: _enrich_status[room_id] = {"total": len(todo), "done": 0, "failed": 0, "started": time.time()}
+    for i in range(0, len(todo), batch_size):
+        _executor.submit(_enrich_batch, room_id, todo[i:i + batch_size], api_key)
+    return len(todo)
+
+def forget_rooms(room_ids):
+    # a törölt szobák állapota se maradjon meg a folyamatban
+    with _status_lock:
+        for room_id in room_ids: _enrich_status.pop(room_id, None)
+
+def enrichment_status(room_id):
+    with _status_lock:
+        status = _enrich_status.get(room_id)
+        return dict(status) if status else None
+
+# --- FUN FACT ELŐTÖLTÉS: a GUESSING fázis elején indul, a felfedés már csak helyi olvasás ---
+def prefetch_fun_facts(cards, api_key):
+    if not api_key or not GROQ_AVAILABLE: return
+    with _fact_lock:
+        if len(_fact_futures) > 500:
+            for k in [k for k, f in _fact_futures.items() if f.done()]: del _fact_futures[k]
+        for card in cards:
+            if not card: continue
+            key = hitster_cache.cache_key(card['artist'], card['title'])
+            if key in _fact_futures: continue
+            _fact_futures[key] = _fact_executor.submit(get_fun_fact_cached, card['artist'], card['title'], api_key)
+
+def prefetch_for_state(state, api_key, ahead=PREFETCH_AHEAD):
+    if state.get('game_phase') != "GUESSING": return
+    if not api_key or not GROQ_AVAILABLE: return
+    upcoming = [hitster_catalog.card_for(item) for item in state.get('deck', [])[-ahead:][::-1]] if ahead else []
+    prefetch_fun_facts([state.get('current_mystery_song')] + upcoming, api_key)
+
+def fun_fact_if_ready(artist, title, wait=0.0):
+    # kész előtöltés vagy tartós cache találat; None, ha még nincs meg (nem indít LLM hívást)
+    with _fact_lock:
+        future = _fact_futures.get(hitster_cache.cache_key(artist, title))
+    if future is not None:
+        try: return future.result(timeout=wait)
+        except FutureTimeout:
+            hitster_metrics.inc("fun_fact_prefetch", result="pending")
+            return None
+        except Exception as e:
+            log.warning("Fun fact prefetch failed (%s - %s): %s", artist, title, e)
+            return None
+    return hitster_cache.get_fun_fact(artist, title, want=1)
+
+def when_fun_fact_ready(artist, title, callback):
+    # késve érkező tény: a callback a kész szöveggel fut le (a háttér szálon)
+    with _fact_lock:
+        future = _fact_futures.get(hitster_cache.cache_key(artist, title))
+    if future is None: return False
+    future.add_done_callback(lambda f: f.exception() is None and callback(f.result()))
+    return True
+
+def _enrich_stats():
+    with _status_lock:
+        statuses = list(_enrich_status.values())
+    with _fact_lock:
+        facts = list(_fact_futures.values())
+    return {"rooms": len(statuses), "pending_cards": sum(s["total"] - s["done"] for s in statuses),
+            "failed_cards": sum(s["failed"] for s in statuses),
+            "fact_prefetch_pending": sum(1 for f in facts if not f.done())}
+
+hitster_metrics.register_collector("ai_enrichment", _enrich_stats)
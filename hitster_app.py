@@ -1,215 +1,54 @@
 import streamlit as st
 import random
-import spotipy
-from spotipy.oauth2 import SpotifyClientCredentials
 import time
-import json
-import sqlite3
-import os
-import qrcode
 from io import BytesIO
 
+from hitster_db import (
+    ROOM_EVICT_INTERVAL, sanitize_room_id, new_room_id, init_db, start_room_janitor,
+    reset_db, load_state, load_state_version, update_state, set_state_backend,
+)
+from hitster_engine import (
+    new_game_state, current_player, deal_game, resolve_turn, advance_round, mark_sound_played, phone_poll_interval,
+)
+from hitster_ai import (
+    check_cards, enrich_deck_async, enrichment_status, forget_rooms,
+    prefetch_for_state, fun_fact_if_ready, when_fun_fact_ready,
+)
+from hitster_catalog import build_deck, get_cards, card_for, record_game, mark_played, catalog_stats
+from hitster_catalog import sources as catalog_sources
+from hitster_spotify import open_track_stream, fill_deck_async
+from hitster_stats import record_turn, record_game_end, leaderboard, decade_accuracy, hardest_songs
+from hitster_media import cover_image, sound_url, warm_covers, warm_sounds
+from hitster_render import timeline_html, slot_labels
+from hitster_metrics import observe, inc, snapshot as metrics_snapshot, export_files as export_metrics, start_exporter
+from hitster_profiler import begin_run, tag_run, end_run, profiled, discard, list_profiles, top_functions
+
 # --- 0. KONFIGURÁCIÓ ---
+RUN_STARTED = time.perf_counter()
 st.set_page_config(page_title="Hitster Party", page_icon="🎵", layout="wide")
+start_exporter()  # metrics/hitster_metrics.json + .prom félpercenként (folyamatonként egy szál)
+# állapot tároló: secrets STATE_BACKEND, különben HITSTER_STATE_BACKEND / sqlite (idempotens)
+set_state_backend(st.secrets.get("STATE_BACKEND"))
 
 if "role" in st.query_params:
     st.session_state.user_role = st.query_params["role"]
+if "room" in st.query_params:
+    st.session_state.room_id = st.query_params["room"]
 
 if 'user_role' not in st.session_state: st.session_state.user_role = "tv"
 if 'sound_enabled' not in st.session_state: st.session_state.sound_enabled = False
 
-# --- ALAPOK ---
-try:
-    from groq import Groq
-except ImportError:
-    Groq = None
-
-DB_FILE = "hitster_party.db"
-
-# --- 1. ADATBÁZIS KEZELÉS (WAL + Optimistic Locking) ---
-def get_db_connection():
-    conn = sqlite3.connect(DB_FILE, check_same_thread=False)
-    conn.execute("PRAGMA journal_mode=WAL;")
-    return conn
-
-def init_db():
-    with get_db_connection() as conn:
-        c = conn.cursor()
-        c.execute('''CREATE TABLE IF NOT EXISTS game_state (id INTEGER PRIMARY KEY, data TEXT)''')
-        c.execute("SELECT count(*) FROM game_state WHERE id=1")
-        if c.fetchone()[0] == 0:
-            default_state = {
-                "version": 0,
-                "game_phase": "LOBBY",
-                "players": [],
-                "timelines": {},
-                # "lives": {},  <-- ELTÁVOLÍTVA
-                "deck": [],
-                "current_mystery_song": None,
-                "turn_index": 0,
-                "game_msg": "",
-                "fun_fact": "",
-                "success": False,
-                "waiting_for_reveal": False,
-                "reveal_processed": False,
-                "reveal_ui_shown": False,
-                "sound_trigger": None,
-                "sound_played": False,
-                "winner": None,
-                "target_score": 10,
-                "last_revealed_song": None
-            }
-            c.execute("INSERT INTO game_state (id, data) VALUES (1, ?)", (json.dumps(default_state),))
-            conn.commit()
-
-def reset_db():
-    current = load_state()
-    players = current.get('players', [])
-    with get_db_connection() as conn:
-        c = conn.cursor()
-        new_state = {
-            "version": current.get('version', 0) + 1,
-            "game_phase": "LOBBY",
-            "players": players,
-            "timelines": {},
-            # "lives": {}, <-- ELTÁVOLÍTVA
-            "deck": [],
-            "current_mystery_song": None,
-            "turn_index": 0,
-            "game_msg": "",
-            "fun_fact": "",
-            "success": False,
-            "waiting_for_reveal": False,
-            "reveal_processed": False,
-            "reveal_ui_shown": False,
-            "winner": None,
-            "target_score": 10,
-            "last_revealed_song": None,
-            "sound_trigger": None,
-            "sound_played": False
-        }
-        c.execute("UPDATE game_state SET data = ? WHERE id = 1", (json.dumps(new_state),))
-        conn.commit()
-
-def load_state():
-    if not os.path.exists(DB_FILE): init_db()
-    try:
-        with get_db_connection() as conn:
-            c = conn.cursor()
-            c.execute("SELECT data FROM game_state WHERE id=1")
-            row = c.fetchone()
-            if row: return json.loads(row[0])
-            else: init_db(); return load_state()
-    except: return {}
-
-def save_state(state, bump_version=True):
-    try:
-        if bump_version:
-            state['version'] = state.get('version', 0) + 1
-        
-        with get_db_connection() as conn:
-            c = conn.cursor()
-            c.execute("UPDATE game_state SET data = ? WHERE id = 1", (json.dumps(state),))
-            conn.commit()
-    except Exception as e:
-        st.error(f"DB Save Error: {e}")
-
-# --- 2. GAME LOGIC ENGINE ---
-def check_guess_logic(timeline, song, pos):
-    if pos == 0:
-        if not timeline: return True
-        return timeline[0]['year'] >= song['year']
-    if pos == len(timeline):
-        return timeline[-1]['year'] <= song['year']
-    prev_card = timeline[pos-1]
-    next_card = timeline[pos]
-    return (prev_card['year'] <= song['year']) and (next_card['year'] >= song['year'])
-
-# --- 3. SPOTIFY & AI (CACHE OPTIMALIZÁLT) ---
-@st.cache_data(ttl=3600, show_spinner=False)
-def load_spotify_tracks(_api_id, _api_secret, playlist_url, limit=80):
-    if not _api_id or not _api_secret: return []
-    try:
-        auth_manager = SpotifyClientCredentials(client_id=_api_id, client_secret=_api_secret)
-        sp = spotipy.Spotify(auth_manager=auth_manager)
-        if "?" in playlist_url: clean_url = playlist_url.split("?")[0]
-        else: clean_url = playlist_url
-        resource_id = clean_url.split("/")[-1]
-        tracks_data = []
-        
-        def get_image(item_obj):
-            try: return item_obj['images'][0]['url']
-            except: return "https://via.placeholder.com/150"
-
-        if "album" in clean_url:
-            results = sp.album_tracks(resource_id)
-            album_info = sp.album(resource_id)
-            year = int(album_info['release_date'][:4])
-            img_url = get_image(album_info)
-            items = results['items']
-            while results['next'] and len(items) < limit:
-                results = sp.next(results)
-                items.extend(results['items'])
-            for track in items:
-                if len(tracks_data) >= limit: break
-                tracks_data.append({
-                    "artist": track['artists'][0]['name'], "title": track['name'], "year": year, 
-                    "spotify_id": track['id'], "image": img_url
-                })
-        elif "playlist" in clean_url:
-            results = sp.playlist_items(resource_id)
-            items = results['items']
-            while results['next'] and len(items) < limit:
-                results = sp.next(results)
-                items.extend(results['items'])
-            for item in items:
-                if len(tracks_data) >= limit: break
-                t = item['track']
-                if t and t['album']['release_date']:
-                    tracks_data.append({
-                        "artist": t['artists'][0]['name'], "title": t['name'], "year": int(t['album']['release_date'][:4]), 
-                        "spotify_id": t['id'], "image": get_image(t['album'])
-                    })
-        return tracks_data
-    except: return []
-
-@st.cache_data(ttl=86400, show_spinner=False)
-def fix_card_with_groq_cached(artist, title, original_year, _api_key):
-    if not _api_key or Groq is None: return original_year
-    try:
-        client = Groq(api_key=_api_key)
-        prompt = f"Fact Check: ORIGINAL release year of '{title}' by '{artist}'? Reply ONLY 4-digit year."
-        completion = client.chat.completions.create(model="llama-3.3-70b-versatile", messages=[{"role": "user", "content": prompt}], temperature=0, max_tokens=10)
-        text = completion.choices[0].message.content.strip()
-        if text.isdigit():
-            ai_year = int(text)
-            if 1900 < ai_year <= 2025: return ai_year
-    except: pass
-    return original_year
-
-def process_card_ai(card, api_key):
-    if not api_key: return card
-    new_year = fix_card_with_groq_cached(card['artist'], card['title'], card['year'], _api_key=api_key)
-    if new_year != card['year']:
-        card['year'] = new_year
-        card['fixed_by_ai'] = True
-    return card
-
-@st.cache_data(ttl=86400, show_spinner=False)
-def get_fun_fact_cached(artist, title, _api_key):
-    if not _api_key or Groq is None: return "Jó kis zene!"
-    try:
-        client = Groq(api_key=_api_key)
-        prompt = f"Tell me a very short (max 1 sentence), interesting trivia fact about the song '{title}' by '{artist}' in HUNGARIAN language. Don't mention the release year."
-        completion = client.chat.completions.create(model="llama-3.3-70b-versatile", messages=[{"role": "user", "content": prompt}], temperature=0.7, max_tokens=100)
-        return completion.choices[0].message.content.strip()
-    except: return "Szuper sláger!"
+# PROFILOZÁS: ?profile=1 vagy a TV admin kapcsolója; a futás végén (end_run) kerül a profiles/ mappába
+PROFILING = st.query_params.get("profile") == "1" or st.session_state.get('profiling', False)
+begin_run(st.session_state, PROFILING, role=st.session_state.user_role)
 
 # --- 4. UI BEÁLLÍTÁS & HANGOK ---
-st.markdown("""
-<style>
+# Szerepenként csak a saját stílusai mennek ki (a telefonnak nem kell a TV idővonal / státusz CSS-e)
+BASE_CSS = """
     .stApp { background: radial-gradient(circle at center, #2b2d42 0%, #1a1a2e 100%); color: #edf2f4; }
     #MainMenu, footer {visibility: hidden;}
+"""
+TV_CSS = """
     .timeline-card {
         background: #222; color: white; border-radius: 10px; text-align: center;
         border: 1px solid rgba(255,255,255,0.2); margin-bottom: 5px; overflow: hidden;
@@ -220,28 +59,27 @@ st.markdown("""
     .card-year { font-size: 1.5em; font-weight: 900; color: #1DB954; }
     .card-title { font-weight: bold; font-size: 0.9em; line-height: 1.2; white-space: nowrap; overflow: hidden; text-overflow: ellipsis; }
     .reveal-highlight { border: 3px solid #ffd700 !important; transform: scale(1.05); box-shadow: 0 0 15px #ffd700; }
-    .mob-insert-btn { width: 100%; padding: 15px; margin: 10px 0; background: rgba(255,255,255,0.1); border: 2px dashed #777; color: white; font-size: 1.2em; border-radius: 8px; cursor: pointer; text-align: center; }
-    .mob-insert-btn:hover { background: #00d4ff; color: black; border-style: solid; }
-    .mob-card-box { display: flex; align-items: center; gap: 10px; background: rgba(0,0,0,0.4); padding: 10px; border-radius: 8px; border: 1px solid #444; }
-    .mob-card-box img { width: 50px; height: 50px; border-radius: 5px; }
+    .timeline-strip { display: flex; gap: 10px; overflow-x: auto; padding: 8px 2px; }
+    .timeline-strip .timeline-card, .timeline-more { flex: 1 1 0; min-width: 110px; max-width: 220px; }
+    .timeline-more { display: flex; flex-direction: column; justify-content: center; text-align: center; border-radius: 10px; border: 1px dashed #777; background: rgba(255,255,255,0.05); }
     .tv-status { padding: 20px; border-radius: 15px; text-align: center; font-size: 1.5em; font-weight: bold; margin: 20px 0; background: rgba(0,0,0,0.5); border: 2px solid #555; animation: pulse 2s infinite; }
     @keyframes pulse { 0% {border-color: #555;} 50% {border-color: #00d4ff;} 100% {border-color: #555;} }
     .trivia-box { background: rgba(255, 255, 0, 0.1); border-left: 5px solid yellow; padding: 15px; margin-top: 20px; font-style: italic; font-size: 1.2em; animation: popIn 1s ease-out; }
     @keyframes popIn { 0% { transform: scale(0.8); opacity: 0; } 100% { transform: scale(1); opacity: 1; } }
     .player-tag { background: #444; padding: 5px 10px; margin: 2px; border-radius: 15px; display: inline-block; font-size: 0.9em; border: 1px solid #777; }
-</style>
-""", unsafe_allow_html=True)
+"""
+PLAYER_CSS = """
+    .mob-card-box { display: flex; align-items: center; gap: 10px; background: rgba(0,0,0,0.4); padding: 10px; border-radius: 8px; border: 1px solid #444; }
+    .mob-card-box img { width: 50px; height: 50px; border-radius: 5px; }
+    .mob-timeline { display: flex; flex-direction: column; gap: 6px; margin: 10px 0; }
+    .mob-more { text-align: center; opacity: 0.7; font-size: 0.9em; }
+"""
+st.markdown(f"<style>{BASE_CSS}{TV_CSS if st.session_state.user_role == 'tv' else PLAYER_CSS}</style>", unsafe_allow_html=True)
 
 def play_sound_if_needed(state):
     if not st.session_state.get('sound_enabled', False): return False
     if state.get('sound_trigger') and not state.get('sound_played'):
-        sounds = {
-            "success": "https://www.myinstants.com/media/sounds/correct.mp3",
-            "fail": "https://www.myinstants.com/media/sounds/wrong-answer-sound-effect.mp3",
-            "win": "https://www.myinstants.com/media/sounds/tada-fanfare-a.mp3",
-            "gameover": "https://www.myinstants.com/media/sounds/spongebob-fail.mp3"
-        }
-        url = sounds.get(state['sound_trigger'])
+        url = sound_url(state['sound_trigger'])  # helyi static/sounds fájl, ha már megvan
         if url:
             st.markdown(f'<audio autoplay playsinline><source src="{url}" type="audio/mpeg"></audio>', unsafe_allow_html=True)
             return True
@@ -249,8 +87,41 @@ def play_sound_if_needed(state):
 
 # --- 5. APP FLOW ---
 if 'refresher' not in st.session_state: st.session_state.refresher = 0
-if not os.path.exists(DB_FILE): init_db()
-state = load_state()
+
+# SZOBA: a TV új kódot kap, ha nincs megadva; a telefon a QR linkből kapja
+if 'room_id' not in st.session_state and st.session_state.user_role == "tv":
+    st.session_state.room_id = new_room_id()
+if 'room_id' in st.session_state:
+    ROOM_ID = sanitize_room_id(st.session_state.room_id)
+    st.session_state.room_id = ROOM_ID
+    if st.query_params.get("room") != ROOM_ID: st.query_params["room"] = ROOM_ID
+else:
+    ROOM_ID = None
+
+# A TV-n kézzel megadott Groq kulcs a szobához kötve (a telefonok tippje ezzel kéri le a fun factet)
+@st.cache_resource
+def room_groq_keys():
+    return {}
+
+# A tétlen szobák törlése háttérszálon fut (nem a felhasználó futását lassítja); a törölt szobák
+# kulcsai és dúsítási állapota se maradjon meg a folyamatban
+@st.cache_resource
+def room_janitor():
+    keys = room_groq_keys()
+    def forget(rooms):
+        for evicted in rooms: keys.pop(evicted, None)
+        forget_rooms(rooms)
+    return start_room_janitor(ROOM_EVICT_INTERVAL, on_evict=forget)
+
+if ROOM_ID:
+    if st.session_state.get('db_room') != ROOM_ID:
+        init_db(ROOM_ID)
+        st.session_state.db_room = ROOM_ID
+    room_janitor()
+    state = load_state(ROOM_ID)
+else:
+    state = new_game_state()
+tag_run(st.session_state, room=ROOM_ID, phase=state.get('game_phase'), version=state.get('version'))
 
 # Secrets + Manual Fallback
 default_id = st.secrets.get("SPOTIFY_ID", "")
@@ -258,6 +129,29 @@ default_secret = st.secrets.get("SPOTIFY_SECRET", "")
 default_groq = st.secrets.get("GROQ_KEY", "")
 if default_groq: st.session_state.manual_groq_key = default_groq
 
+FUN_FACT_WAIT = 0.3  # ennyit várunk tippeléskor egy még futó előtöltésre (mp)
+CATALOG_YEAR_MIN = 1950  # a katalógus évszám csúszka alsó határa (ennél nem szűrünk)
+PHONE_POLL_FAST = 1.0  # telefon verzió figyelés, ha te jössz (vagy te jössz a következő körben), mp
+PHONE_POLL_SLOW = 4.0  # ... egyébként
+METRICS_PANEL_TTL = 5  # az admin teljesítmény panel pillanatképének élettartama, mp
+
+def room_groq_key(room_id):
+    return room_groq_keys().get(room_id) or default_groq
+
+# A lobby QR kód PNG-je linkenként egyszer készül el
+@st.cache_data(max_entries=64)
+def qr_png(link):
+    import qrcode  # csak a TV lobby használja
+    buf = BytesIO()
+    qrcode.make(link).save(buf)
+    return buf.getvalue()
+
+# Az admin panel pillanatképe néhány mp-ig közös (a gyűjtők így nem futnak le minden megnyitott futásnál);
+# a folyamatos gyűjtést a háttér exporter végzi
+@st.cache_data(ttl=METRICS_PANEL_TTL)
+def metrics_panel_snapshot():
+    return metrics_snapshot()
+
 with st.sidebar:
     st.title("🎛️ MENÜ")
     role_idx = 0 if st.session_state.user_role == "tv" else 1
@@ -269,6 +163,17 @@ with st.sidebar:
 
     st.divider()
 
+    room_input = st.text_input("🚪 Szoba kód:", value=ROOM_ID or "")
+    if room_input and sanitize_room_id(room_input) != ROOM_ID:
+        st.session_state.room_id = sanitize_room_id(room_input)
+        st.session_state.pop('my_name', None)
+        st.rerun()
+    if st.session_state.user_role == "tv" and st.button("➕ Új szoba"):
+        st.session_state.room_id = new_room_id()
+        st.rerun()
+
+    st.divider()
+
     if st.session_state.user_role == "tv":
         st.header("⚙️ Beállítások")
         if state['game_phase'] == "LOBBY":
@@ -279,17 +184,21 @@ with st.sidebar:
                 elif not new_p.strip(): st.error("Üres név!")
                 elif new_p in state['players']: st.error("Foglalt név!")
                 else:
-                    state['players'].append(new_p)
-                    save_state(state) 
-                    st.success(f"{new_p} hozzáadva!")
+                    def add_player(s):
+                        if s['game_phase'] != "LOBBY" or new_p in s['players']: return False
+                        s['players'].append(new_p)
+                    if update_state(ROOM_ID, add_player, event="player_added"):
+                        st.success(f"{new_p} hozzáadva!")
                     st.rerun()
             if state['players']:
                 st.write("Csatlakoztak:")
                 for p in state['players']:
                     st.markdown(f"<span class='player-tag'>{p}</span>", unsafe_allow_html=True)
                 if st.button("🗑️ Lista Törlése"):
-                    state['players'] = []
-                    save_state(state)
+                    def clear_players(s):
+                        if s['game_phase'] != "LOBBY": return False
+                        s['players'] = []
+                    update_state(ROOM_ID, clear_players, event="players_cleared")
                     st.rerun()
             st.divider()
 
@@ -297,7 +206,9 @@ with st.sidebar:
         api_secret = st.text_input("Spotify Secret", value=default_secret, type="password")
         groq_key = st.text_input("Groq Key", value=default_groq, type="password")
         
-        if groq_key: st.session_state.manual_groq_key = groq_key
+        if groq_key:
+            st.session_state.manual_groq_key = groq_key
+            room_groq_keys()[ROOM_ID] = groq_key
         
         pl_url = st.text_input("Playlist URL", value="https://open.spotify.com/playlist/37i9dQZF1DXbTxeAdrVG2l")
         target_score = st.number_input("🏆 Cél:", min_value=1, value=10)
@@ -305,57 +216,106 @@ with st.sidebar:
         
         if st.checkbox("🔊 Hangok engedélyezése", value=st.session_state.sound_enabled):
             st.session_state.sound_enabled = True
+            warm_sounds()
         else:
             st.session_state.sound_enabled = False
 
         if state['game_phase'] == "LOBBY":
+            # a helyi katalógusból Spotify nélkül, azonnal összeáll a pakli
+            deck_source = st.radio("🎵 Pakli forrás:", ["Spotify lista", "Helyi katalógus"], horizontal=True)
+            if deck_source == "Helyi katalógus":
+                cat_sources = catalog_sources()
+                labels = ["Minden dal"] + [f"{key} ({n} dal)" for key, n in cat_sources]
+                picked = st.selectbox("Lista:", range(len(labels)), format_func=lambda i: labels[i])
+                this_year = time.localtime().tm_year
+                year_from, year_to = st.slider("Évek:", CATALOG_YEAR_MIN, this_year, (CATALOG_YEAR_MIN, this_year))
+                balanced = st.checkbox("Évtizedenként kiegyensúlyozott", value=True)
+                exclude_recent = st.number_input("Az utolsó N játék dalai kimaradnak:", min_value=0, value=0)
+                difficulty = st.radio("Nehézség:", ["Vegyes", "Könnyebb", "Nehezebb"], horizontal=True,
+                                      help="A korábbi játékok tippjei alapján")
+                stats = catalog_stats()
+                st.caption(f"📚 Katalógus: {stats['tracks']} dal, ebből {stats['ai_checked']} AI-ellenőrzött")
+
             if st.button("🚀 JÁTÉK START", type="primary", disabled=len(state['players']) == 0):
-                if api_id and api_secret and pl_url:
-                    with st.spinner("Zene betöltése..."):
-                        deck = load_spotify_tracks(_api_id=api_id, _api_secret=api_secret, playlist_url=pl_url, limit=song_limit_val)
-                        if not deck:
-                            st.error("❌ HIBA: Nem sikerült betölteni a zenéket! Ellenőrizd a kódokat!")
-                        else:
-                            random.shuffle(deck)
-                            current_players = state['players']
-                            new_state = {
-                                "version": state.get('version', 0) + 1,
-                                "game_phase": "GUESSING",
-                                "players": current_players,
-                                "timelines": {p: [] for p in current_players},
-                                # "lives" TÖRÖLVE
-                                "deck": deck,
-                                "current_mystery_song": None,
-                                "turn_index": 0,
-                                "game_msg": "",
-                                "fun_fact": "",
-                                "success": False,
-                                "waiting_for_reveal": False,
-                                "reveal_processed": False,
-                                "reveal_ui_shown": False,
-                                "winner": None,
-                                "target_score": target_score,
-                                "last_revealed_song": None,
-                                "sound_trigger": None,
-                                "sound_played": False
-                            }
-                            for p in new_state['players']:
-                                if new_state['deck']:
-                                    c = new_state['deck'].pop()
-                                    if groq_key or default_groq: c = process_card_ai(c, groq_key or default_groq)
-                                    new_state['timelines'][p].append(c)
-                            if new_state['deck']:
-                                first = new_state['deck'].pop()
-                                if groq_key or default_groq: first = process_card_ai(first, groq_key or default_groq)
-                                new_state['current_mystery_song'] = first
-                            
-                            save_state(new_state)
-                            st.rerun()
+                current_players = list(state['players'])
+                ai_key = groq_key or default_groq
+                more_pages = None
+                deck = []
+                with st.spinner("Zene betöltése..."):
+                    if deck_source == "Helyi katalógus":
+                        deck = build_deck(song_limit_val, source_key=cat_sources[picked - 1][0] if picked else None,
+                                          year_from=year_from if year_from > CATALOG_YEAR_MIN else None,
+                                          year_to=year_to if year_to < this_year else None,
+                                          balanced=balanced, exclude_recent=exclude_recent,
+                                          difficulty={"Könnyebb": "easy", "Nehezebb": "hard"}.get(difficulty))
+                        if not deck: st.error("❌ Nincs ilyen dal a katalógusban! Tölts be egy listát vagy lazíts a szűrőkön!")
+                    elif api_id and api_secret and pl_url:
+                        # csak annyi oldal töltődik be most, amennyi a kiosztáshoz kell, a többi a háttérben jön
+                        cards, more_pages = open_track_stream(api_id, api_secret, pl_url, limit=song_limit_val, min_first=len(current_players) + 1)
+                        deck = list(dict.fromkeys(c['id'] for c in cards))
+                        if not deck: st.error("❌ HIBA: Nem sikerült betölteni a zenéket! Ellenőrizd a kódokat!")
+                    if deck and len(deck) < len(current_players) + 1:
+                        # mindenkinek kell egy kezdő kártya, plusz az első rejtélyes dal
+                        st.error(f"❌ Túl kevés dal ({len(deck)}) {len(current_players)} játékoshoz! Lazíts a szűrőkön vagy tölts be több dalt!")
+                        deck = []
+                if deck:
+                    # a pakli csak katalógus id-ket tárol
+                    random.shuffle(deck)
+                    # csak a kiosztandó kártyákat ellenőrizzük most, EGY kötegelt kéréssel (a katalógusba visszaírva)
+                    if ai_key: check_cards(get_cards(deck[-(len(current_players) + 1):]), ai_key)
+                    new_state = deal_game(current_players, deck, target_score=target_score, card_for=card_for)
+                    def start_game(s):
+                        if s['game_phase'] != "LOBBY" or s['players'] != current_players: return False
+                        new_state['version'] = s['version']
+                        s.clear(); s.update(new_state)
+                    started = update_state(ROOM_ID, start_game, event="game_started")
+                    if not started:
+                        st.error("⚠️ A játékosok listája közben megváltozott, indítsd újra!")
+                    else:
+                        opening = [c for tl in started['timelines'].values() for c in tl] + [started['current_mystery_song']]
+                        record_game(started['game_id'], ROOM_ID, played=opening)
+                        # a pakli többi része a háttérben kap AI évszámot és helyi borító bélyegképet
+                        deck_cards = get_cards(started['deck'])
+                        warm_covers(opening + deck_cards[::-1])
+                        if ai_key:
+                            prefetch_for_state(started, ai_key)
+                            enrich_deck_async(ROOM_ID, deck_cards, ai_key)
+                        if more_pages:
+                            def on_page(page, room=ROOM_ID, key=ai_key):
+                                warm_covers(page)
+                                if key: enrich_deck_async(room, page, key)
+                            fill_deck_async(ROOM_ID, started['game_id'], more_pages, on_page=on_page)
+                        st.rerun()
         else:
             if st.button("🔄 ÚJ PARTI (RESET)", type="primary"):
-                reset_db()
+                reset_db(ROOM_ID)
                 st.rerun()
 
+        ai_status = enrichment_status(ROOM_ID)
+        if ai_status and ai_status["done"] < ai_status["total"]:
+            st.caption(f"🤖 AI évszám ellenőrzés: {ai_status['done']}/{ai_status['total']}")
+
+        # ADMIN: az expander törzse csukva is lefutna minden futásnál, ezért kapcsolóval, csak kérésre épül fel
+        if st.toggle("📈 Teljesítmény (admin)", key="show_metrics"):
+            metrics = metrics_panel_snapshot()
+            if metrics['latency']:
+                st.dataframe([{"művelet": op, "db": m['count'], "átlag ms": m['mean_ms'], "p50": m['p50_ms'], "p90": m['p90_ms'],
+                               "p99": m['p99_ms'], "max": m['max_ms']} for op, m in metrics['latency'].items()], hide_index=True)
+            st.json({"counters": metrics['counters'], "gauges": metrics['gauges']}, expanded=False)
+            st.json(metrics['collectors'], expanded=False)
+            if st.button("💾 Export (JSON + Prometheus)"):
+                st.success("Kiírva: " + ", ".join(export_metrics()))
+        st.toggle("🔬 Profilozás (minden futás)", key="profiling", help="Telefonon: ?profile=1 a linkben")
+        if st.toggle("🔬 Profilok (admin)", key="show_profiles"):
+            profiles = list_profiles()
+            if profiles:
+                picked = st.selectbox("Profil:", range(len(profiles)), format_func=lambda i: (
+                    f"{time.strftime('%H:%M:%S', time.localtime(profiles[i]['started']))} {profiles[i]['kind']} "
+                    f"{profiles[i].get('role')} {profiles[i].get('phase')} v{profiles[i].get('version')} "
+                    f"{profiles[i]['duration_ms']:.0f} ms" + (" (megszakítva)" if profiles[i]['interrupted'] else "")))
+                sort = st.radio("Rendezés:", ["cumulative", "tottime"], horizontal=True)
+                st.code(top_functions(profiles[picked]['path'], sort=sort))
+
 # ==========================
 # 📺 TV NÉZET
 # ==========================
@@ -363,29 +323,46 @@ if st.session_state.user_role == "tv":
     st.title("📺 Hitster Party Pro")
 
     if play_sound_if_needed(state):
-        state['sound_played'] = True
-        save_state(state, bump_version=False)
+        played_trigger = state.get('sound_trigger')
+        update_state(ROOM_ID, lambda s: mark_sound_played(s, played_trigger), bump_version=False, event="sound_played")
 
     if state.get('game_phase') == "LOBBY":
         st.info("👈 Állítsd össze a csapatot!")
         c1, c2 = st.columns([2, 1])
         with c1:
-            st.write("📲 **Csatlakozás QR kóddal:**")
+            st.write(f"📲 **Csatlakozás QR kóddal** (szoba: `{ROOM_ID}`):")
             base_url = st.text_input("Link (QR-hez):", value="https://te-appod.streamlit.app")
             if base_url:
-                qr_link = f"{base_url}?role=player"
-                qr = qrcode.make(qr_link)
-                buf = BytesIO()
-                qr.save(buf)
-                st.image(buf, width=250, caption="Szkenneld be!")
+                qr_link = f"{base_url.rstrip('/')}?role=player&room={ROOM_ID}"
+                st.image(qr_png(qr_link), width=250, caption="Szkenneld be!")
         with c2:
             st.metric("Csatlakozva", f"{len(state['players'])} fő")
 
+        # a korábbi játékok összesítői (előre számolt táblákból, nem a teljes történetből)
+        st.subheader("🏅 Ranglista")
+        t1, t2, t3 = st.tabs(["Játékosok", "Évtizedek", "Legnehezebb dalok"])
+        with t1:
+            rows = leaderboard()
+            if rows: st.dataframe([{"játékos": r['player'], "játék": r['games'], "győzelem": r['wins'],
+                                    "győzelmi arány": f"{r['win_rate']:.0%}", "tipp": r['guesses'],
+                                    "pontosság": f"{r['accuracy']:.0%}" if r['accuracy'] is not None else "-"} for r in rows], hide_index=True)
+            else: st.caption("Még nincs befejezett játék.")
+        with t2:
+            # a csatlakozott játékosokra, ha nekik még nincs adatuk, akkor mindenkire
+            rows = decade_accuracy(state['players']) or decade_accuracy()
+            if rows: st.dataframe([{"évtized": f"{r['decade']}s", "tipp": r['guesses'], "pontosság": f"{r['accuracy']:.0%}"} for r in rows], hide_index=True)
+            else: st.caption("Még nincs tipp.")
+        with t3:
+            rows = hardest_songs()
+            if rows: st.dataframe([{"dal": f"{r['artist']} - {r['title']}", "év": r['year'], "tipp": r['guesses'],
+                                    "talált": r['correct']} for r in rows], hide_index=True)
+            else: st.caption("Még nincs elég tipp.")
+
     elif state.get('game_phase') == "GUESSING":
         if not state['players']:
             st.error("Nincsenek játékosok!")
         else:
-            curr_p = state['players'][state['turn_index'] % len(state['players'])]
+            curr_p = current_player(state)
             song = state['current_mystery_song']
             
             # PONTOK (Szívecskék eltávolítva)
@@ -402,58 +379,27 @@ if st.session_state.user_role == "tv":
             st.markdown(f"### 🎶 Most játszik: {song['artist']} - ???")
             st.components.v1.iframe(f"https://open.spotify.com/embed/track/{song['spotify_id']}", height=80)
             
+            rendered_version = state.get('version', 0)
+            prefetch_for_state(state, room_groq_key(ROOM_ID))  # idempotens: ami fut / kész, azt nem indítja újra
+            
+            # A felfedést már a tipp tranzakciója elvégzi, a TV csak figyeli a verziót
             @st.fragment(run_every=1)
             def auto_reveal_watcher():
-                current_state = load_state()
-                if current_state.get('waiting_for_reveal') and not current_state.get('reveal_processed'):
-                    
-                    if not current_state.get('reveal_ui_shown'):
-                        st.success("✅ TIPP ÉRKEZETT! KIÉRTÉKELÉS...")
-                        current_state['reveal_ui_shown'] = True 
-                        save_state(current_state, bump_version=False)
-                    
-                    current_state['reveal_processed'] = True
-                    current_state['game_phase'] = "REVEAL"
-                    current_state['waiting_for_reveal'] = False
-                    
-                    current_state['last_revealed_song'] = current_state['current_mystery_song']
-                    
-                    groq_k = st.session_state.get("manual_groq_key") or st.secrets.get("GROQ_KEY")
-                    if groq_k:
-                        current_state['fun_fact'] = get_fun_fact_cached(current_state['current_mystery_song']['artist'], current_state['current_mystery_song']['title'], _api_key=groq_k)
-                    
-                    curr_p_name = current_state['players'][current_state['turn_index'] % len(current_state['players'])]
-                    
-                    if current_state['success']:
-                        current_state['sound_trigger'] = "success"
+                # csak a változást hozó frissítés profilja marad meg, a puszta verzió lekérdezésé nem
+                with profiled(PROFILING, "auto_reveal_watcher", role="tv", room=ROOM_ID, phase="GUESSING", version=rendered_version) as prof:
+                    current = load_state_version(ROOM_ID)
+                    if current and current[0] != rendered_version:
+                        st.session_state.refresher += 1
+                        st.rerun()
                     else:
-                        # ÉLET LEVONÁS TÖRÖLVE
-                        current_state['sound_trigger'] = "fail"
-                    
-                    current_state['sound_played'] = False
-                    
-                    if len(current_state['timelines'][curr_p_name]) >= current_state.get('target_score', 10):
-                        current_state['game_phase'] = "VICTORY"
-                        current_state['winner'] = curr_p_name
-                        current_state['sound_trigger'] = "win"
-                    
-                    # GAME OVER (ÉLET) FELTÉTEL TÖRÖLVE
-                    
-                    save_state(current_state)
-                    st.session_state.refresher += 1
-                    st.rerun()
-                else:
-                    st.markdown(f"<div class='tv-status'>👉 {curr_p} tippel a telefonján...</div>", unsafe_allow_html=True)
+                        discard(prof)
+                        st.markdown(f"<div class='tv-status'>👉 {curr_p} tippel a telefonján...</div>", unsafe_allow_html=True)
 
             auto_reveal_watcher()
             st.divider()
             
             timeline = state['timelines'][curr_p]
-            if timeline:
-                t_cols = st.columns(len(timeline))
-                for i, card in enumerate(timeline):
-                    with t_cols[i]:
-                        st.markdown(f"<div class='timeline-card'><img src='{card.get('image', '')}'><div class='card-content'><div class='card-year'>{card['year']}</div><div class='card-title'>{card['title']}</div></div></div>", unsafe_allow_html=True)
+            if timeline: st.markdown(timeline_html(curr_p, timeline), unsafe_allow_html=True)
 
     elif state.get('game_phase') == "REVEAL":
         song = state.get('last_revealed_song') or state['current_mystery_song']
@@ -461,51 +407,47 @@ if st.session_state.user_role == "tv":
         msg = "TALÁLT! 🎉" if state['success'] else "NEM TALÁLT... 😢"
         
         c1, c2 = st.columns([1, 2])
-        with c1: st.image(song.get('image'), use_container_width=True)
+        with c1: st.image(cover_image(song), use_container_width=True)
         with c2:
             st.markdown(f"<h1 style='color:{color}; font-size:3em; margin:0;'>{msg}</h1>", unsafe_allow_html=True)
             st.markdown(f"<h2>{song['artist']} - {song['title']}</h2>", unsafe_allow_html=True)
             st.markdown(f"<h1 style='font-size:4em; font-weight:900;'>{song['year']}</h1>", unsafe_allow_html=True)
             if state.get('fun_fact'): st.markdown(f"<div class='trivia-box'>🧠 <b>Tudtad?</b> {state['fun_fact']}</div>", unsafe_allow_html=True)
+            elif room_groq_key(ROOM_ID):
+                # a késve érkező fun fact verzióemeléssel íródik be: addig a TV csak a verziót figyeli
+                rendered_version = state.get('version', 0)
+                @st.fragment(run_every=1)
+                def fun_fact_watcher():
+                    current = load_state_version(ROOM_ID)
+                    if current and current[0] != rendered_version: st.rerun()
+                fun_fact_watcher()
         
         st.divider()
         
-        curr_p = state['players'][state['turn_index'] % len(state['players'])]
+        curr_p = current_player(state)
         timeline = state['timelines'][curr_p]
         if timeline:
-            t_cols = st.columns(len(timeline))
-            for i, card in enumerate(timeline):
-                css_class = "timeline-card reveal-highlight" if (state['success'] and card['spotify_id'] == song['spotify_id']) else "timeline-card"
-                with t_cols[i]:
-                    st.markdown(f"<div class='{css_class}'><img src='{card.get('image', '')}'><div class='card-content'><div class='card-year'>{card['year']}</div><div class='card-title'>{card['title']}</div></div></div>", unsafe_allow_html=True)
+            st.markdown(timeline_html(curr_p, timeline, highlight_id=song['spotify_id'] if state['success'] else None), unsafe_allow_html=True)
 
         if st.button("➡️ KÖVETKEZŐ KÖR", type="primary", use_container_width=True):
-            state['turn_index'] += 1
-            if state['deck']:
-                next_song = state['deck'].pop()
-                groq_k = st.session_state.get("manual_groq_key") or st.secrets.get("GROQ_KEY")
-                if groq_k: next_song = process_card_ai(next_song, groq_k)
-                state['current_mystery_song'] = next_song
-                state['game_phase'] = "GUESSING"
-                state['fun_fact'] = ""
-                state['last_revealed_song'] = None
-                state['sound_trigger'] = None
-                state['sound_played'] = False
-                state['reveal_processed'] = False
-                state['reveal_ui_shown'] = False
-            else: state['game_phase'] = "GAME_OVER"
-            save_state(state)
+            # a pakli évszámait a háttér dúsítás már javította, itt nincs hálózati hívás
+            round_turn = state['turn_index']
+            advanced = update_state(ROOM_ID, lambda s: advance_round(s, card_for=card_for, turn_index=round_turn), event="round_advanced")
+            if advanced:
+                if advanced['game_phase'] == "GAME_OVER": record_game_end(advanced, ROOM_ID)
+                mark_played(advanced.get('game_id'), [advanced['current_mystery_song']] if advanced['game_phase'] == "GUESSING" else [])
+                prefetch_for_state(advanced, room_groq_key(ROOM_ID))
             st.rerun()
 
     elif state.get('game_phase') == "VICTORY":
         st.balloons()
         st.title(f"🏆 GYŐZTES: {state.get('winner')}! 🏆")
         st.image("https://media.giphy.com/media/26tOZ42Mg6pbTUPHW/giphy.gif")
-        if st.button("Új játék"): reset_db(); st.rerun()
+        if st.button("Új játék"): reset_db(ROOM_ID); st.rerun()
 
     elif state.get('game_phase') == "GAME_OVER":
         st.title("💀 A játék véget ért (Elfogyott a pakli).")
-        if st.button("Újra"): reset_db(); st.rerun()
+        if st.button("Újra"): reset_db(ROOM_ID); st.rerun()
 
 # ==========================
 # 📱 TELEFON NÉZET
@@ -513,7 +455,9 @@ if st.session_state.user_role == "tv":
 elif st.session_state.user_role == "player":
     st.header("📱 Játékos")
     
-    if 'my_name' not in st.session_state:
+    if not ROOM_ID:
+        st.warning("Add meg a szoba kódját a menüben, vagy szkenneld be a TV QR kódját!")
+    elif 'my_name' not in st.session_state:
         players_list = state.get('players', [])
         if not players_list:
             st.warning("Még nincsenek játékosok!")
@@ -527,65 +471,90 @@ elif st.session_state.user_role == "player":
         me = st.session_state.my_name
         # ÉLET KIJELZÉS TÖRÖLVE
         st.caption(f"Belépve: **{me}**")
-        
-        if st.button("🔄 Frissítés", use_container_width=True): st.rerun()
-
-        state = load_state()
-        local_version = state.get('version', 0)
 
-        if state.get('game_phase') == "GUESSING":
-            curr_p = state['players'][state['turn_index'] % len(state['players'])]
+        def player_game_view(state):
+            if state.get('game_phase') == "GUESSING":
+                curr_p = current_player(state)
             
-            if curr_p == me:
-                if state.get('waiting_for_reveal'):
-                    st.success("✅ TIPP ELKÜLDVE!")
-                    st.info("Nézd a TV-t!")
-                else:
+                if curr_p == me:
                     st.success("🔴 TE JÖSSZ!")
                     fresh_timeline = state['timelines'][me]
-                    
-                    def try_save_guess(pos):
-                        fresh_state = load_state()
-                        if fresh_state.get('version', 0) != local_version:
-                            st.toast("⚠️ Állapot frissült, próbáld újra!")
-                            time.sleep(1)
-                            st.rerun()
-                            return
-
-                        song = fresh_state['current_mystery_song']
-                        already_in = any(c['spotify_id'] == song['spotify_id'] for c in fresh_timeline)
-                        
-                        if not already_in:
-                            fresh_state['success'] = check_guess_logic(fresh_state['timelines'][me], song, pos)
-                            fresh_state['last_revealed_song'] = song
-                            
-                            if fresh_state['success']: 
-                                fresh_state['timelines'][me].insert(pos, song)
-                            
-                            fresh_state['waiting_for_reveal'] = True
-                            fresh_state['reveal_processed'] = False
-                            save_state(fresh_state)
-                            st.rerun()
 
-                    if st.button("⬇️ IDE (Elejére) ⬇️", key="mob_btn_start", use_container_width=True):
-                        try_save_guess(0)
+                    seen_song_id = state['current_mystery_song']['spotify_id']
 
-                    for i, card in enumerate(fresh_timeline):
-                        st.markdown(f"<div class='mob-card-box'><img src='{card.get('image', '')}'><div><div style='font-weight:bold; font-size:1.2em'>{card['year']}</div><div>{card['title']}</div></div></div>", unsafe_allow_html=True)
-                        if st.button(f"⬇️ IDE ⬇️", key=f"mob_btn_{i+1}", use_container_width=True):
-                            try_save_guess(i + 1)
-            else:
-                st.warning(f"Most {curr_p} gondolkodik...")
+                    def try_save_guess(pos):
+                        # a fun factet a TV a kör elején előtöltötte: itt csak helyi olvasás (rövid türelmi idővel)
+                        song = state['current_mystery_song']
+                        groq_k = room_groq_key(ROOM_ID)
+                        fun_fact = fun_fact_if_ready(song['artist'], song['title'], wait=FUN_FACT_WAIT) if groq_k else None
+                    
+                        def apply_guess(s):
+                            if s['current_mystery_song']['spotify_id'] != seen_song_id: return False
+                            return resolve_turn(s, me, pos, fun_fact)
+                    
+                        # az ütközéseket az update_state automatikusan újrapróbálja
+                        guessed = update_state(ROOM_ID, apply_guess, event="guess_made")
+                        if guessed is None:
+                            st.toast("⚠️ A tipp nem ment át, a kör közben megváltozott!")
+                            st.rerun()
+                        # a tipp eredménye a játékokon átívelő statisztikába (játékonként dalonként egyszer)
+                        record_turn(guessed, me, ROOM_ID)
+                        if guessed['game_phase'] == "VICTORY": record_game_end(guessed, ROOM_ID)
+                        if groq_k and not fun_fact:
+                            # ha az előtöltés még fut, a kész tény utólag kerül be (verzióemeléssel, hogy a TV újrarajzoljon)
+                            def late_fact(fact, room=ROOM_ID, song_id=seen_song_id):
+                                def patch(s):
+                                    last = s.get('last_revealed_song') or {}
+                                    if s.get('fun_fact') or last.get('spotify_id') != song_id: return False
+                                    s['fun_fact'] = fact
+                                update_state(room, patch, event="fun_fact_added")
+                            when_fun_fact_ready(song['artist'], song['title'], late_fact)
+                        st.rerun()
+
+                    # egy HTML blokk az idővonalnak + egy választó és egy gomb (nem kártyánként egy gomb)
+                    if fresh_timeline: st.markdown(timeline_html(me, fresh_timeline, layout="mobile"), unsafe_allow_html=True)
+                    labels = slot_labels(fresh_timeline)
+                    pos = st.radio("Hová kerül a dal?", range(len(labels)), format_func=lambda i: labels[i], key=f"mob_slot_{seen_song_id}")
+                    if st.button("✅ TIPP KÜLDÉSE", key="mob_btn_send", type="primary", use_container_width=True):
+                        try_save_guess(pos)
+                else:
+                    st.warning(f"Most {curr_p} gondolkodik...")
                 
-        elif state.get('game_phase') == "REVEAL":
-            song = state.get('last_revealed_song') or state['current_mystery_song']
-            color = "green" if state['success'] else "red"
-            msg = "TALÁLT!" if state['success'] else "NEM TALÁLT..."
-            st.markdown(f"<h2 style='text-align:center; color:{color};'>{msg}</h2>", unsafe_allow_html=True)
-            if song:
-                st.image(song.get('image', ''), use_container_width=True)
-                st.markdown(f"<div style='text-align:center'>HELYES ÉV: <b>{song['year']}</b><br>{song['title']}</div>", unsafe_allow_html=True)
-            st.info("Várd meg a következő kört!")
+            elif state.get('game_phase') == "REVEAL":
+                song = state.get('last_revealed_song') or state['current_mystery_song']
+                color = "green" if state['success'] else "red"
+                msg = "TALÁLT!" if state['success'] else "NEM TALÁLT..."
+                st.markdown(f"<h2 style='text-align:center; color:{color};'>{msg}</h2>", unsafe_allow_html=True)
+                if song:
+                    st.image(cover_image(song, "tv"), use_container_width=True)
+                    st.markdown(f"<div style='text-align:center'>HELYES ÉV: <b>{song['year']}</b><br>{song['title']}</div>", unsafe_allow_html=True)
+                st.info("Várd meg a következő kört!")
         
-        else:
-            st.info("Várakozás a játékra...")
+            else:
+                st.info("Várakozás a játékra...")
+
+        # VERZIÓ FIGYELÉS: a "Frissítés" gomb helyett a telefon csak a verziót kérdezi le (olcsó), a teljes állapot
+        # csak változáskor töltődik be, és csak ez a rész rajzolódik újra. Ha te jössz / te jössz a következő
+        # körben, gyakrabban néz rá; ha a változás miatt az ütem is változik, egy teljes futás állítja át.
+        st.session_state.phone_view = state
+        poll_every = phone_poll_interval(state, me, PHONE_POLL_FAST, PHONE_POLL_SLOW)
+
+        @st.fragment(run_every=poll_every)
+        def phone_watcher():
+            view = st.session_state.phone_view
+            with profiled(PROFILING, "phone_watcher", role="player", room=ROOM_ID, phase=view.get('game_phase'), version=view.get('version')) as prof:
+                current = load_state_version(ROOM_ID)
+                if current and current[0] != view.get('version'):
+                    inc("phone_poll", result="changed")
+                    view = st.session_state.phone_view = load_state(ROOM_ID)
+                    if phone_poll_interval(view, me, PHONE_POLL_FAST, PHONE_POLL_SLOW) != poll_every: st.rerun()
+                else:
+                    inc("phone_poll", result="same")
+                    discard(prof)  # változás nélkül nem mentünk profilt
+                player_game_view(view)
+
+        phone_watcher()
+
+end_run(st.session_state)
+# a teljes futás ideje szerepenként (az st.rerun()-nal megszakított futások nem számítanak)
+observe("app.run", time.perf_counter() - RUN_STARTED, role=st.session_state.user_role)
@@ -0,0 +1,105 @@
+# --- TARTÓS AI CACHE (évszám javítások + fun factek) ---
+# Külön SQLite fájl a hitster_party.db mellett, így újraindítás / deploy után sem fizetjük újra az LLM hívásokat.
+# Kulcs: előadó|cím (normalizálva), a spotify_id csak tájékoztató oszlop.
+import threading
+import time
+
+import hitster_db
+import hitster_metrics
+
+AI_CACHE_FILE = "hitster_ai_cache.db"
+AI_CACHE_MAX_YEARS = 50000      # ennyi dal évszáma fér el, utána LRU törlés
+AI_CACHE_MAX_FACTS = 60000      # ennyi fun fact sor fér el, utána LRU törlés
+FUN_FACTS_PER_SONG = 1          # >1 esetén ennyi különböző tényt gyűjtünk dalonként és körbe forgatjuk
+EVICT_CHECK_EVERY = 200         # ennyi beszúrás után nézzük meg a méretkorlátot
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS year_cache (
+    song_key TEXT PRIMARY KEY, spotify_id TEXT, year INTEGER NOT NULL,
+    created_at REAL NOT NULL, last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_year_cache_used ON year_cache (last_used);
+CREATE TABLE IF NOT EXISTS fun_facts (
+    song_key TEXT NOT NULL, idx INTEGER NOT NULL, fact TEXT NOT NULL,
+    created_at REAL NOT NULL, last_used REAL NOT NULL, PRIMARY KEY (song_key, idx)
+);
+CREATE INDEX IF NOT EXISTS idx_fun_facts_used ON fun_facts (last_used);
+'''
+
+_lock = threading.Lock()
+_stats = {"year_hits": 0, "year_misses": 0, "fact_hits": 0, "fact_misses": 0, "inserts": 0, "evicted": 0}
+
+def cache_key(artist, title):
+    return f"{artist.strip().lower()}|{title.strip().lower()}"
+
+def _connection():
+    return hitster_db.schema_connection(SCHEMA, AI_CACHE_FILE)
+
+def _note_inserts(conn, n):
+    with _lock:
+        before = _stats["inserts"]
+        _stats["inserts"] += n
+        due = before // EVICT_CHECK_EVERY != _stats["inserts"] // EVICT_CHECK_EVERY
+    if not due: return
+    for table, limit in (("year_cache", AI_CACHE_MAX_YEARS), ("fun_facts", AI_CACHE_MAX_FACTS)):
+        extra = conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0] - limit
+        if extra > 0:
+            conn.execute(f"DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} ORDER BY last_used LIMIT ?)", (extra,))
+            _stats["evicted"] += extra
+
+def get_years(cards):
+    # {cache_key: év} a már ellenőrzött dalokra
+    if not cards: return {}
+    keys = list({cache_key(c['artist'], c['title']) for c in cards})
+    found = {}
+    with _connection() as conn:
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            rows = conn.execute(f"SELECT song_key, year FROM year_cache WHERE song_key IN ({','.join('?' * len(chunk))})", chunk).fetchall()
+            found.update(rows)
+        if found:
+            conn.executemany("UPDATE year_cache SET last_used = ? WHERE song_key = ?", [(time.time(), k) for k in found])
+    with _lock:
+        _stats["year_hits"] += len(found)
+        _stats["year_misses"] += len(keys) - len(found)
+    return found
+
+def put_years(cards, years_by_key):
+    now = time.time()
+    rows = [(cache_key(c['artist'], c['title']), c.get('spotify_id'), years_by_key[cache_key(c['artist'], c['title'])], now, now)
+            for c in cards if cache_key(c['artist'], c['title']) in years_by_key]
+    if not rows: return
+    with _connection() as conn:
+        conn.executemany("INSERT OR REPLACE INTO year_cache (song_key, spotify_id, year, created_at, last_used) VALUES (?, ?, ?, ?, ?)", rows)
+        _note_inserts(conn, len(rows))
+
+def get_fun_fact(artist, title, want=FUN_FACTS_PER_SONG):
+    # A legrégebben mutatott tényt adja (forgatás); None, ha még kevesebb van, mint `want`
+    key = cache_key(artist, title)
+    with _connection() as conn:
+        rows = conn.execute("SELECT idx, fact FROM fun_facts WHERE song_key = ? ORDER BY last_used", (key,)).fetchall()
+        if len(rows) >= max(want, 1):
+            conn.execute("UPDATE fun_facts SET last_used = ? WHERE song_key = ? AND idx = ?", (time.time(), key, rows[0][0]))
+            with _lock: _stats["fact_hits"] += 1
+            return rows[0][1]
+    with _lock: _stats["fact_misses"] += 1
+    return None
+
+def put_fun_fact(artist, title, fact):
+    key = cache_key(artist, title)
+    now = time.time()
+    with _connection() as conn:
+        if conn.execute("SELECT 1 FROM fun_facts WHERE song_key = ? AND fact = ?", (key, fact)).fetchone(): return
+        idx = conn.execute("SELECT COALESCE(MAX(idx), -1) + 1 FROM fun_facts WHERE song_key = ?", (key,)).fetchone()[0]
+        conn.execute("INSERT INTO fun_facts (song_key, idx, fact, created_at, last_used) VALUES (?, ?, ?, ?, ?)", (key, idx, fact, now, now))
+        _note_inserts(conn, 1)
+
+def ai_cache_stats():
+    with _lock:
+        stats = dict(_stats)
+    for kind in ("year", "fact"):
+        total = stats[f"{kind}_hits"] + stats[f"{kind}_misses"]
+        stats[f"{kind}_hit_rate"] = round(stats[f"{kind}_hits"] / total, 3) if total else None
+    return stats
+
+hitster_metrics.register_collector("ai_cache", ai_cache_stats)
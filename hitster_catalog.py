@@ -0,0 +1,150 @@
+# --- HELYI DAL KATALÓGUS ---
+# Minden betöltött playlist / album ide kerül (az AI által javított évszámokkal együtt), a pakli pedig
+# csak katalógus id-ket tárol. Így egy új pakli Spotify nélkül, egy lekérdezéssel összeállítható.
+import random
+import time
+
+import hitster_db
+import hitster_metrics
+import hitster_stats
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS tracks (
+    id INTEGER PRIMARY KEY, spotify_id TEXT NOT NULL UNIQUE, artist TEXT NOT NULL, title TEXT NOT NULL,
+    year INTEGER NOT NULL, decade INTEGER NOT NULL, image TEXT,
+    ai_checked INTEGER NOT NULL DEFAULT 0, fixed_by_ai INTEGER NOT NULL DEFAULT 0,
+    last_game INTEGER, added_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tracks_year ON tracks (year);
+CREATE INDEX IF NOT EXISTS idx_tracks_decade ON tracks (decade);
+CREATE INDEX IF NOT EXISTS idx_tracks_artist ON tracks (artist);
+CREATE TABLE IF NOT EXISTS track_sources (
+    source_key TEXT NOT NULL, track_id INTEGER NOT NULL REFERENCES tracks(id) ON DELETE CASCADE,
+    PRIMARY KEY (source_key, track_id)
+);
+CREATE INDEX IF NOT EXISTS idx_track_sources_track ON track_sources (track_id);
+CREATE TABLE IF NOT EXISTS catalog_games (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT, game_id TEXT NOT NULL UNIQUE, room_id TEXT, started_at REAL NOT NULL
+);
+'''
+
+TRACK_COLUMNS = "id, spotify_id, artist, title, year, image, ai_checked, fixed_by_ai"
+DIFFICULTY_POOL = 3      # nehézség szerinti válogatásnál ennyiszer több jelöltből választunk
+DIFFICULTY_JITTER = 0.15  # véletlen eltolás, hogy a még nem tippelt (0.5) dalok is bekeveredjenek
+
+def _connection():
+    return hitster_db.schema_connection(SCHEMA)
+
+def _card(row):
+    card = {"id": row[0], "spotify_id": row[1], "artist": row[2], "title": row[3], "year": row[4], "image": row[5]}
+    if row[6]: card['ai_checked'] = True
+    if row[7]: card['fixed_by_ai'] = True
+    return card
+
+def _select(conn, ids):
+    found = {}
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        for row in conn.execute(f"SELECT {TRACK_COLUMNS} FROM tracks WHERE id IN ({','.join('?' * len(chunk))})", chunk):
+            found[row[0]] = _card(row)
+    return found
+
+def add_tracks(cards, source_key=None):
+    # upsert spotify_id szerint; az AI-ellenőrzött évszámot a Spotify adata nem írja felül.
+    # A katalógusbeli kártyákat adja vissza (id-vel, a javított évvel), az eredeti sorrendben.
+    cards = [c for c in cards if c.get('spotify_id')]  # helyi fájlok (id nélkül) nem kerülnek be
+    if not cards: return []
+    now = time.time()
+    with _connection() as conn:
+        conn.executemany('''
+            INSERT INTO tracks (spotify_id, artist, title, year, decade, image, added_at) VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(spotify_id) DO UPDATE SET artist = excluded.artist, title = excluded.title, image = excluded.image,
+                year = CASE WHEN ai_checked THEN year ELSE excluded.year END,
+                decade = CASE WHEN ai_checked THEN decade ELSE excluded.decade END''',
+            [(c['spotify_id'], c['artist'], c['title'], c['year'], c['year'] // 10 * 10, c.get('image'), now) for c in cards])
+        spotify_ids = list(dict.fromkeys(c['spotify_id'] for c in cards))
+        by_spotify = {}
+        for i in range(0, len(spotify_ids), 500):
+            chunk = spotify_ids[i:i + 500]
+            for row in conn.execute(f"SELECT {TRACK_COLUMNS} FROM tracks WHERE spotify_id IN ({','.join('?' * len(chunk))})", chunk):
+                by_spotify[row[1]] = _card(row)
+        if source_key:
+            conn.executemany("INSERT OR IGNORE INTO track_sources (source_key, track_id) VALUES (?, ?)",
+                             [(source_key, c['id']) for c in by_spotify.values()])
+    return [by_spotify[c['spotify_id']] for c in cards]
+
+def get_cards(ids):
+    # id lista -> kártya lista (a hiányzó id-k kimaradnak)
+    if not ids: return []
+    with _connection() as conn: found = _select(conn, list(dict.fromkeys(ids)))
+    return [found[i] for i in ids if i in found]
+
+def card_for(item):
+    # a pakli egy eleméből kártya; a régi, teljes kártyás paklik elemei változatlanul jönnek vissza
+    if isinstance(item, dict): return item
+    with _connection() as conn: row = conn.execute(f"SELECT {TRACK_COLUMNS} FROM tracks WHERE id = ?", (item,)).fetchone()
+    return _card(row) if row else None
+
+def store_years(checked):
+    # AI-ellenőrzött kártyák évszámának visszaírása a katalógusba
+    rows = [(c['year'], c['year'] // 10 * 10, int(bool(c.get('fixed_by_ai'))), c['id']) for c in checked if c.get('id') and c.get('ai_checked')]
+    if not rows: return
+    with _connection() as conn:
+        conn.executemany("UPDATE tracks SET year = ?, decade = ?, ai_checked = 1, fixed_by_ai = MAX(fixed_by_ai, ?) WHERE id = ?", rows)
+
+@hitster_metrics.timed("catalog.build_deck")
+def build_deck(limit, source_key=None, year_from=None, year_to=None, balanced=False, exclude_recent=0, difficulty=None):
+    # keverve visszaadott id lista; balanced: évtizedenként felváltva válogat, így egyik évtized sem nyomja el a többit;
+    # difficulty ("easy" / "hard"): a korábbi játékok tippjei alapján a könnyebb / nehezebb dalok kerülnek előre
+    where, args = [], []
+    if source_key:
+        where.append("id IN (SELECT track_id FROM track_sources WHERE source_key = ?)")
+        args.append(source_key)
+    if year_from:
+        where.append("year >= ?")
+        args.append(year_from)
+    if year_to:
+        where.append("year <= ?")
+        args.append(year_to)
+    if exclude_recent:
+        where.append("(last_game IS NULL OR last_game <= (SELECT COALESCE(MAX(seq), 0) FROM catalog_games) - ?)")
+        args.append(exclude_recent)
+    cond = f"WHERE {' AND '.join(where)}" if where else ""
+    if balanced:
+        sql = f'''SELECT id, spotify_id FROM (SELECT id, spotify_id, ROW_NUMBER() OVER (PARTITION BY decade ORDER BY random()) AS rn
+                  FROM tracks {cond}) ORDER BY rn, random() LIMIT ?'''
+    else:
+        sql = f"SELECT id, spotify_id FROM tracks {cond} ORDER BY random() LIMIT ?"
+    with _connection() as conn:
+        rows = conn.execute(sql, args + [limit * DIFFICULTY_POOL if difficulty else limit]).fetchall()
+    if difficulty:
+        known = hitster_stats.song_difficulty([sid for _, sid in rows])
+        sign = -1 if difficulty == "hard" else 1
+        rows.sort(key=lambda r: sign * known.get(r[1], 0.5) + random.uniform(-DIFFICULTY_JITTER, DIFFICULTY_JITTER))
+        rows = rows[:limit]
+    ids = [r[0] for r in rows]
+    random.shuffle(ids)
+    return ids
+
+def record_game(game_id, room_id, played=()):
+    with _connection() as conn:
+        conn.execute("INSERT OR IGNORE INTO catalog_games (game_id, room_id, started_at) VALUES (?, ?, ?)", (game_id, room_id, time.time()))
+    mark_played(game_id, played)
+
+def mark_played(game_id, played):
+    ids = [i for i in (c.get('id') if isinstance(c, dict) else c for c in played) if i]
+    if not ids: return
+    with _connection() as conn:
+        conn.executemany("UPDATE tracks SET last_game = (SELECT seq FROM catalog_games WHERE game_id = ?) WHERE id = ?",
+                         [(game_id, i) for i in ids])
+
+def sources():
+    # [(source_key, dalok száma)] a pakli forrás választóhoz
+    with _connection() as conn:
+        return conn.execute("SELECT source_key, count(*) FROM track_sources GROUP BY source_key ORDER BY source_key").fetchall()
+
+def catalog_stats():
+    with _connection() as conn:
+        total, checked = conn.execute("SELECT count(*), COALESCE(SUM(ai_checked), 0) FROM tracks").fetchone()
+        decades = conn.execute("SELECT decade, count(*) FROM tracks GROUP BY decade ORDER BY decade").fetchall()
+    return {"tracks": total, "ai_checked": checked, "decades": dict(decades)}
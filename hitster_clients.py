@@ -0,0 +1,105 @@
+# --- KÖZÖS API KLIENSEK (Spotify, Groq) ---
+# Kulcsonként egy, a folyamatban megosztott kliens: a keep-alive HTTP kapcsolat és a Spotify token
+# (memóriában) a hívások között megmarad, nem épül újra minden cache hiánynál.
+#   upstream(name)            szolgáltatónkénti párhuzamossági korlát (a várakozás mérve)
+#   single_flight(key, fn)    az egyszerre érkező azonos kérések egyetlen hívást osztanak meg
+# A spotipy / groq csomag csak az első kliens létrehozásakor töltődik be.
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+import hitster_metrics
+
+SPOTIFY_TIMEOUT = 10  # mp / kérés
+SPOTIFY_RETRIES = 2
+GROQ_TIMEOUT = 20
+GROQ_RETRIES = 1
+UPSTREAM_LIMITS = {"spotify": 4, "groq": 4}  # egyszerre futó kérések szolgáltatónként
+MAX_CLIENTS = 16  # ennyi különböző kulcs kliense marad meg (a legrégebben használt esik ki)
+
+_clients_lock = threading.Lock()
+_clients = OrderedDict()  # (szolgáltató, kulcsok) -> kliens
+_flight_lock = threading.Lock()
+_in_flight = {}  # kulcs -> Future
+_upstreams = {name: {"sem": threading.BoundedSemaphore(n), "limit": n, "active": 0, "waiting": 0}
+              for name, n in UPSTREAM_LIMITS.items()}
+
+def _client(key, factory):
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is not None:
+            _clients.move_to_end(key)
+            return client
+    # a létrehozás (csomag import, session) a záron kívül fut; versenyhelyzetben az elsőként beírt nyer
+    client = factory()
+    hitster_metrics.inc("api_clients_created", upstream=key[0])
+    with _clients_lock:
+        client = _clients.setdefault(key, client)
+        _clients.move_to_end(key)
+        while len(_clients) > MAX_CLIENTS: _clients.popitem(last=False)
+    return client
+
+def spotify_client(api_id, api_secret):
+    def create():
+        import spotipy
+        from spotipy.cache_handler import MemoryCacheHandler
+        from spotipy.oauth2 import SpotifyClientCredentials
+        # a token a memóriában marad (nem .cache fájlban), lejáratig minden hívás ezt használja
+        auth = SpotifyClientCredentials(client_id=api_id, client_secret=api_secret, requests_timeout=SPOTIFY_TIMEOUT,
+                                        cache_handler=MemoryCacheHandler())
+        return spotipy.Spotify(auth_manager=auth, requests_timeout=SPOTIFY_TIMEOUT, retries=SPOTIFY_RETRIES)
+    return _client(("spotify", api_id, api_secret), create)
+
+def groq_client(api_key):
+    def create():
+        from groq import Groq
+        return Groq(api_key=api_key, timeout=GROQ_TIMEOUT, max_retries=GROQ_RETRIES)
+    return _client(("groq", api_key), create)
+
+@contextmanager
+def upstream(name):
+    u = _upstreams[name]
+    with _flight_lock: u["waiting"] += 1
+    try:
+        with hitster_metrics.timer("upstream.wait", upstream=name):
+            u["sem"].acquire()
+    finally:
+        with _flight_lock: u["waiting"] -= 1
+    with _flight_lock: u["active"] += 1
+    try:
+        yield
+    finally:
+        with _flight_lock: u["active"] -= 1
+        u["sem"].release()
+
+def single_flight(key, fn):
+    # az első hívó futtatja fn-t, a közben érkező azonos kulcsú hívók ugyanazt az eredményt / kivételt kapják
+    with _flight_lock:
+        future = _in_flight.get(key)
+        leader = future is None
+        if leader: future = _in_flight[key] = Future()
+    if not leader:
+        hitster_metrics.inc("upstream_coalesced", upstream=key[0])
+        return future.result()
+    try:
+        result = fn()
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        with _flight_lock: _in_flight.pop(key, None)
+
+def _client_stats():
+    with _clients_lock:
+        clients = [key[0] for key in _clients]
+    with _flight_lock:
+        stats = {name: {"limit": u["limit"], "active": u["active"], "waiting": u["waiting"]} for name, u in _upstreams.items()}
+        stats["in_flight"] = len(_in_flight)
+    stats["clients"] = {name: clients.count(name) for name in UPSTREAM_LIMITS}
+    return stats
+
+hitster_metrics.register_collector("api_clients", _client_stats)
@@ -0,0 +1,585 @@
+import json
+import logging
+import os
+import copy
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import hitster_journal
+import hitster_metrics
+from hitster_engine import new_game_state
+from hitster_store import MemoryStateStore
+
+log = logging.getLogger(__name__)
+
+DB_FILE = "hitster_party.db"
+DEFAULT_ROOM = "default"
+ROOM_IDLE_TTL = 6 * 3600  # ennyi tétlenség után a szoba törlődik (mp)
+ROOM_EVICT_INTERVAL = 300
+# állapot tároló motor: "sqlite" (alap, több folyamat is használhatja) vagy "memory" (egy szerver folyamat,
+# a kérések útján nincs lemez I/O); memory esetén ennyi mp-enként a háttérben SQLite-ba is kiíródik (0 = sosem)
+STATE_BACKEND = os.environ.get("HITSTER_STATE_BACKEND", "sqlite")
+STATE_FLUSH_INTERVAL = float(os.environ.get("HITSTER_STATE_FLUSH_INTERVAL", "2"))
+
+def sanitize_room_id(raw):
+    room = "".join(ch for ch in str(raw or "").lower() if ch.isalnum() or ch == "-")[:24]
+    return room or DEFAULT_ROOM
+
+def new_room_id():
+    return "".join(random.choice("abcdefghjkmnpqrstuvwxyz23456789") for _ in range(5))
+
+# --- 1. ADATBÁZIS KEZELÉS (WAL + Optimistic Locking, szobánként normalizált sorok) ---
+# Hangolt SQLite profil: minden új kapcsolat egyszer kapja meg, utána a poolból újrahasznosítjuk
+DB_PRAGMAS = (
+    "PRAGMA journal_mode=WAL;",
+    "PRAGMA busy_timeout=5000;",
+    "PRAGMA synchronous=NORMAL;",
+    "PRAGMA cache_size=-8000;",
+    "PRAGMA temp_store=MEMORY;",
+    "PRAGMA foreign_keys=ON;",
+)
+DB_POOL_MAX_IDLE = 8
+DB_CHECKPOINT_EVERY = 200  # ennyi commit után PASSIVE WAL checkpoint
+
+class ConnectionPool:
+    def __init__(self, db_file, max_idle=DB_POOL_MAX_IDLE, checkpoint_every=DB_CHECKPOINT_EVERY):
+        self.db_file = db_file
+        self.max_idle = max_idle
+        self.checkpoint_every = checkpoint_every
+        self._idle = []
+        self._lock = threading.Lock()
+        self._commits_since_checkpoint = 0
+        self.stats = {"opened": 0, "reused": 0, "closed": 0, "in_use": 0, "commits": 0, "rollbacks": 0, "checkpoints": 0}
+
+    def _open(self):
+        conn = sqlite3.connect(self.db_file, check_same_thread=False, timeout=5)
+        for pragma in DB_PRAGMAS: conn.execute(pragma)
+        self.stats["opened"] += 1
+        return conn
+
+    def acquire(self):
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+            if conn is not None: self.stats["reused"] += 1
+            self.stats["in_use"] += 1
+        return conn if conn is not None else self._open()
+
+    def release(self, conn, broken=False):
+        with self._lock:
+            self.stats["in_use"] -= 1
+            if not broken and len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+            self.stats["closed"] += 1
+        conn.close()
+
+    def note_commit(self, conn):
+        with self._lock:
+            self.stats["commits"] += 1
+            self._commits_since_checkpoint += 1
+            due = self._commits_since_checkpoint >= self.checkpoint_every
+            if due: self._commits_since_checkpoint = 0
+        if due:
+            try:
+                conn.execute("PRAGMA wal_checkpoint(PASSIVE);")
+                self.stats["checkpoints"] += 1
+            except sqlite3.Error: pass
+
+    @contextmanager
+    def connection(self):
+        # Ugyanaz a szemantika, mint a `with sqlite3.connect(...)`: siker -> commit, hiba -> rollback
+        conn = self.acquire()
+        broken = False
+        try:
+            yield conn
+            if conn.in_transaction:
+                conn.commit()
+                self.note_commit(conn)
+        except BaseException:
+            try: conn.rollback()
+            except sqlite3.Error: broken = True
+            self.stats["rollbacks"] += 1
+            raise
+        finally:
+            self.release(conn, broken=broken)
+
+# Folyamat-szintű példányok (a Streamlit újrafuttatások között is megmaradnak, mert a modul csak egyszer töltődik be)
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_db_pool(db_file=None):
+    db_file = db_file or DB_FILE
+    with _pools_lock:
+        if db_file not in _pools: _pools[db_file] = ConnectionPool(db_file)
+        return _pools[db_file]
+
+def get_db_connection():
+    return get_db_pool(DB_FILE).connection()
+
+def db_pool_stats():
+    return dict(get_db_pool(DB_FILE).stats)
+
+# A modulok saját táblái (katalógus, statisztikák, lista cache, AI cache): a sémájuk fájlonként egyszer fut le
+_module_schemas = set()  # (db_file, séma)
+_module_schemas_lock = threading.Lock()
+
+def schema_connection(schema, db_file=None):
+    db_file = db_file or DB_FILE
+    pool = get_db_pool(db_file)
+    if (db_file, schema) not in _module_schemas:
+        with _module_schemas_lock:
+            if (db_file, schema) not in _module_schemas:
+                with pool.connection() as conn: conn.executescript(schema)
+                _module_schemas.add((db_file, schema))
+    return pool.connection()
+
+def set_db_file(path):
+    # pl. a szimulátor külön adatbázist használ; ugyanarra a fájlra nem csinál semmit
+    # (a motor újraépítése elveszítené a lezárás utáni írásokat és nullázná a tranzakció számlálókat)
+    global DB_FILE
+    if path == DB_FILE: return
+    if _store["engine"] is not None and _store["engine"].name != "sqlite":
+        # a memóriában tartott szobák a régi fájlhoz tartoznak: kiírás oda, majd új, üres motor ugyanazzal a beállítással
+        _store["engine"].close()
+        _store["engine"] = None
+    DB_FILE = path
+    _state_cache["rooms"].clear()
+
+# --- NORMALIZÁLT SÉMA: meta / játékosok / idővonal kártyák / pakli / aktuális dal ---
+# Az írás csak a ténylegesen megváltozott sorokat írja (delta), nem az egész játékot.
+META_FIELDS = ("game_phase", "turn_index", "target_score", "game_msg", "fun_fact", "success",
+               "waiting_for_reveal", "reveal_processed", "reveal_ui_shown", "sound_trigger",
+               "sound_played", "winner")
+SONG_FIELDS = ("current_mystery_song", "last_revealed_song")
+STATE_KEYS = ("version", "players", "timelines", "deck") + META_FIELDS + SONG_FIELDS
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS game_meta (
+    room_id TEXT PRIMARY KEY, version INTEGER NOT NULL DEFAULT 0, rev INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL, game_phase TEXT, turn_index INTEGER, target_score INTEGER, game_msg TEXT,
+    fun_fact TEXT, success INTEGER, waiting_for_reveal INTEGER, reveal_processed INTEGER,
+    reveal_ui_shown INTEGER, sound_trigger TEXT, sound_played INTEGER, winner TEXT, extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_game_meta_updated ON game_meta (updated_at);
+CREATE TABLE IF NOT EXISTS players (
+    room_id TEXT NOT NULL REFERENCES game_meta(room_id) ON DELETE CASCADE,
+    seat INTEGER NOT NULL, name TEXT NOT NULL, PRIMARY KEY (room_id, seat)
+);
+CREATE TABLE IF NOT EXISTS timeline_cards (
+    room_id TEXT NOT NULL REFERENCES game_meta(room_id) ON DELETE CASCADE,
+    player TEXT NOT NULL, sort_key REAL NOT NULL, card TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_timeline_cards ON timeline_cards (room_id, player, sort_key);
+CREATE TABLE IF NOT EXISTS deck_cards (
+    room_id TEXT NOT NULL REFERENCES game_meta(room_id) ON DELETE CASCADE,
+    pos INTEGER NOT NULL, card TEXT NOT NULL, PRIMARY KEY (room_id, pos)
+);
+CREATE TABLE IF NOT EXISTS current_song (
+    room_id TEXT PRIMARY KEY REFERENCES game_meta(room_id) ON DELETE CASCADE,
+    current_mystery_song TEXT, last_revealed_song TEXT
+);
+'''
+
+# írási mennyiség (sorok / payload bájtok), a szimulátor írás-amplifikáció méréséhez
+_write_stats = {"rows": 0, "bytes": 0}
+
+def get_write_stats():
+    return _write_stats
+
+class _CountingCursor:
+    def __init__(self, cur): self._cur = cur
+    def __getattr__(self, name): return getattr(self._cur, name)
+
+    def _note(self, sql, rows):
+        if sql.lstrip().startswith("SELECT"): return
+        for params in rows:
+            _write_stats["bytes"] += sum(len(p) for p in params if isinstance(p, (str, bytes)))
+        _write_stats["rows"] += max(self._cur.rowcount, 0)
+
+    def execute(self, sql, params=()):
+        res = self._cur.execute(sql, params)
+        self._note(sql, [params])
+        return res
+
+    def executemany(self, sql, seq):
+        seq = list(seq)
+        res = self._cur.executemany(sql, seq)
+        self._note(sql, seq)
+        return res
+
+def _dump(obj): return None if obj is None else json.dumps(obj)
+def _load(text): return None if text is None else json.loads(text)
+
+class StateConflict(Exception):
+    pass
+
+def _write_delta(c, room_id, old, new, expect=None):
+    # old=None -> teljes írás (új szoba / migráció)
+    # expect=(version, rev) -> compare-and-swap: ha közben más írt, StateConflict
+    c = _CountingCursor(c)
+    old = old or {}
+    if not old:
+        c.execute("INSERT OR IGNORE INTO game_meta (room_id) VALUES (?)", (room_id,))
+    extra = {k: v for k, v in new.items() if k not in STATE_KEYS}
+    changed = [f for f in META_FIELDS if f not in old or old.get(f) != new.get(f)]
+    sets = ["version = ?", "rev = rev + 1", "updated_at = ?"] + [f"{f} = ?" for f in changed]
+    args = [new.get('version', 0), time.time()] + [new.get(f) for f in changed]
+    if not old or extra != {k: v for k, v in old.items() if k not in STATE_KEYS}:
+        sets.append("extra = ?"); args.append(json.dumps(extra))
+    where, where_args = "room_id = ?", [room_id]
+    if expect is not None:
+        where += " AND version = ? AND rev = ?"; where_args += list(expect)
+    c.execute(f"UPDATE game_meta SET {', '.join(sets)} WHERE {where}", args + where_args)
+    if expect is not None and c.rowcount == 0: raise StateConflict(room_id)
+
+    if not old or old.get('players') != new.get('players'):
+        c.execute("DELETE FROM players WHERE room_id = ?", (room_id,))
+        c.executemany("INSERT INTO players (room_id, seat, name) VALUES (?, ?, ?)",
+                      [(room_id, i, p) for i, p in enumerate(new.get('players', []))])
+
+    if not old or any(old.get(f) != new.get(f) for f in SONG_FIELDS):
+        c.execute("INSERT OR REPLACE INTO current_song (room_id, current_mystery_song, last_revealed_song) VALUES (?, ?, ?)",
+                  (room_id, _dump(new.get('current_mystery_song')), _dump(new.get('last_revealed_song'))))
+
+    old_tl, new_tl = old.get('timelines', {}), new.get('timelines', {})
+    for p in set(old_tl) | set(new_tl):
+        before, after = old_tl.get(p, []), new_tl.get(p, [])
+        if before == after: continue
+        pos = _single_insert_pos(before, after)
+        if pos is not None:
+            # egy kártya beszúrása: a szomszédok sort_key-e közé kerül, egyetlen sor
+            keys = [r[0] for r in c.execute("SELECT sort_key FROM timeline_cards WHERE room_id=? AND player=? ORDER BY sort_key", (room_id, p))]
+            lo = keys[pos - 1] if pos > 0 else (keys[0] - 2 if keys else -1)
+            hi = keys[pos] if pos < len(keys) else lo + 2
+            c.execute("INSERT INTO timeline_cards (room_id, player, sort_key, card) VALUES (?, ?, ?, ?)",
+                      (room_id, p, (lo + hi) / 2, json.dumps(after[pos])))
+        else:
+            c.execute("DELETE FROM timeline_cards WHERE room_id=? AND player=?", (room_id, p))
+            c.executemany("INSERT INTO timeline_cards (room_id, player, sort_key, card) VALUES (?, ?, ?, ?)",
+                          [(room_id, p, float(i), json.dumps(card)) for i, card in enumerate(after)])
+
+    before, after = old.get('deck', []), new.get('deck', [])
+    if before != after:
+        # pop() a pakli végéről -> csak a vége törlődik; javított kártyák -> csak azok a sorok
+        common = min(len(before), len(after))
+        c.executemany("INSERT OR REPLACE INTO deck_cards (room_id, pos, card) VALUES (?, ?, ?)",
+                      [(room_id, i, json.dumps(after[i])) for i in range(common) if before[i] != after[i]])
+        if len(before) > common:
+            c.execute("DELETE FROM deck_cards WHERE room_id=? AND pos >= ?", (room_id, common))
+        c.executemany("INSERT INTO deck_cards (room_id, pos, card) VALUES (?, ?, ?)",
+                      [(room_id, i, json.dumps(after[i])) for i in range(common, len(after))])
+
+def _single_insert_pos(before, after):
+    if len(after) != len(before) + 1: return None
+    i = 0
+    while i < len(before) and before[i] == after[i]: i += 1
+    return i if before[i:] == after[i + 1:] else None
+
+def _read_state(c, room_id):
+    # a sqlite3 a SELECT-ekhez nem nyit tranzakciót: anélkül minden lekérdezés más WAL pillanatképet látna, és a
+    # közben lefutó írás félig régi, félig új állapotot adna. Egy olvasási tranzakcióban (ha még nincs) olvasunk.
+    own = not c.connection.in_transaction
+    if own: c.execute("BEGIN")
+    try: return _read_rows(c, room_id)
+    finally:
+        if own: c.execute("COMMIT")
+
+def _read_rows(c, room_id):
+    meta = c.execute(f"SELECT version, rev, extra, {', '.join(META_FIELDS)} FROM game_meta WHERE room_id=?", (room_id,)).fetchone()
+    if not meta: return None, None, 0
+    size = len(meta[2] or "")  # a beolvasott JSON mezők hossza (a db_state_bytes mérőhöz, újra szerializálás nélkül)
+    state = json.loads(meta[2] or "{}")
+    state['version'] = meta[0]
+    for f, v in zip(META_FIELDS, meta[3:]):
+        state[f] = bool(v) if f in ("success", "waiting_for_reveal", "reveal_processed", "reveal_ui_shown", "sound_played") else v
+    state['players'] = [r[0] for r in c.execute("SELECT name FROM players WHERE room_id=? ORDER BY seat", (room_id,))]
+    state['timelines'] = {p: [] for p in state['players']}
+    for p, card in c.execute("SELECT player, card FROM timeline_cards WHERE room_id=? ORDER BY player, sort_key", (room_id,)):
+        state['timelines'].setdefault(p, []).append(json.loads(card))
+        size += len(card)
+    deck = [r[0] for r in c.execute("SELECT card FROM deck_cards WHERE room_id=? ORDER BY pos", (room_id,))]
+    state['deck'] = [json.loads(card) for card in deck]
+    size += sum(map(len, deck))
+    songs = c.execute("SELECT current_mystery_song, last_revealed_song FROM current_song WHERE room_id=?", (room_id,)).fetchone()
+    state['current_mystery_song'] = _load(songs[0]) if songs else None
+    state['last_revealed_song'] = _load(songs[1]) if songs else None
+    if songs: size += len(songs[0] or "") + len(songs[1] or "")
+    return state, (meta[0], meta[1]), size
+
+_schema_ready = set()  # DB fájlok, amelyeken a séma + migráció már lefutott ebben a folyamatban
+
+def _init_schema(c):
+    c.executescript(SCHEMA)
+    c.executescript(hitster_journal.SCHEMA)
+    # MIGRÁCIÓ: a régi JSON blob sorok (game_state id=1 / game_rooms) a normalizált táblákba kerülnek
+    tables = {r[0] for r in c.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    if 'game_state' in tables:
+        old = c.execute("SELECT data FROM game_state WHERE id=1").fetchone()
+        if old and not c.execute("SELECT 1 FROM game_meta WHERE room_id=?", (DEFAULT_ROOM,)).fetchone():
+            _write_delta(c, DEFAULT_ROOM, None, json.loads(old[0]))
+            hitster_journal.append_event(c, DEFAULT_ROOM, "state_restored", None, json.loads(old[0]))
+        c.execute("DROP TABLE game_state")
+    if 'game_rooms' in tables:
+        for rid, data in c.execute("SELECT room_id, data FROM game_rooms").fetchall():
+            if not c.execute("SELECT 1 FROM game_meta WHERE room_id=?", (rid,)).fetchone():
+                _write_delta(c, rid, None, json.loads(data))
+                hitster_journal.append_event(c, rid, "state_restored", None, json.loads(data))
+        c.execute("DROP TABLE game_rooms")
+
+def _ensure_schema(c):
+    if DB_FILE not in _schema_ready or not os.path.exists(DB_FILE):
+        _init_schema(c)
+        _schema_ready.add(DB_FILE)
+
+def _sqlite_init_db(room_id=DEFAULT_ROOM):
+    # a sémát folyamatonként egyszer futtatjuk, utána egy új munkamenetnek (pl. QR-ről belépő telefon)
+    # csak egy SELECT jut
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        _ensure_schema(c)
+        if not c.execute("SELECT 1 FROM game_meta WHERE room_id=?", (room_id,)).fetchone():
+            # HELYREÁLLÍTÁS: ha a szoba sorai eltűntek (nem a tétlen törlés vitte el), a naplóból épül újra
+            last = c.execute("SELECT MAX(created_at) FROM game_events WHERE room_id=?", (room_id,)).fetchone()[0]
+            restored = hitster_journal.rebuild_state(c, room_id)[0] if last and last > time.time() - ROOM_IDLE_TTL else None
+            if restored:
+                log.warning("Room %s restored from the event journal", room_id)
+                _write_delta(c, room_id, None, restored)
+                hitster_journal.append_event(c, room_id, "state_restored", None, restored)
+            else:
+                fresh = new_game_state()
+                _write_delta(c, room_id, None, fresh)
+                hitster_journal.append_event(c, room_id, "room_created", None, fresh)
+
+def _sqlite_evict(max_idle=ROOM_IDLE_TTL, keep=()):
+    # a törölt szobák id-i (a hívó ezek alapján dobhatja el a saját, szobánkénti adatait);
+    # keep: ezek maradnak (pl. a memória motorban még élő szobák, amiknek az updated_at-je a kiírásig régi)
+    try:
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            rooms = [r[0] for r in c.execute("SELECT room_id FROM game_meta WHERE updated_at < ?", (time.time() - max_idle,))
+                     if r[0] not in keep]
+            c.executemany("DELETE FROM game_meta WHERE room_id = ?", [(r,) for r in rooms])
+            hitster_journal.prune(c)
+    except sqlite3.Error: return []
+    with _state_cache["lock"]:
+        for room_id in rooms: _state_cache["rooms"].pop(room_id, None)
+    return rooms
+
+def reset_db(room_id=DEFAULT_ROOM):
+    def reset(s):
+        fresh = new_game_state(players=s.get('players', []), version=s.get('version', 0))
+        s.clear(); s.update(fresh)
+    return update_state(room_id, reset, event="game_reset")
+
+# --- SNAPSHOT CACHE: szobánként egy közös, már összerakott állapot, (version, rev) kulccsal ---
+# A rev minden írásnál nő (bump_version=False esetén is), a version csak játéklépésnél.
+_state_cache = {"lock": threading.Lock(), "rooms": {}, "hits": 0, "misses": 0}
+
+def get_state_cache():
+    return _state_cache
+
+def _sqlite_version(room_id=DEFAULT_ROOM):
+    try:
+        with get_db_connection() as conn:
+            row = conn.execute("SELECT version, rev FROM game_meta WHERE room_id=?", (room_id,)).fetchone()
+            return (row[0], row[1]) if row else None
+    except sqlite3.Error: return None
+
+def _cached_snapshot(c, room_id, with_key=False):
+    cache = get_state_cache()
+    key = c.execute("SELECT version, rev FROM game_meta WHERE room_id=?", (room_id,)).fetchone()
+    cached = cache["rooms"].get(room_id)
+    if key and cached and cached[0] == tuple(key):
+        cache["hits"] += 1
+        state = cached[1]
+    else:
+        state, key, size = _read_state(c, room_id)
+        if state is not None:
+            cache["misses"] += 1
+            with cache["lock"]: cache["rooms"][room_id] = (key, state)
+            hitster_metrics.set_gauge("db_state_bytes", size, room=room_id)
+    return (state, tuple(key) if key else None) if with_key else state
+
+def _sqlite_load_state(room_id=DEFAULT_ROOM, fresh=False):
+    if not os.path.exists(DB_FILE): _sqlite_init_db(room_id)
+    try:
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            state = _read_state(c, room_id)[0] if fresh else _cached_snapshot(c, room_id)
+            if state is None:
+                _sqlite_init_db(room_id); return _sqlite_load_state(room_id, fresh=fresh)
+            return state
+    except Exception as e:
+        log.error("DB Load Error: %s", e)
+        return {}
+
+# --- TRANZAKCIÓS FRISSÍTÉS: mutate(state) a friss példányon, majd UPDATE ... WHERE version = ? AND rev = ? ---
+# Ütközésnél (más írt közben) rövid jitteres várakozás és automatikus újrapróbálás.
+# A mutate False-szal jelezheti, hogy nincs teendő (pl. már feldolgozta valaki más).
+# Az `event` név a naplóba kerül (hitster_journal), a változással együtt, ugyanabban a tranzakcióban.
+TXN_MAX_RETRIES = 6
+
+_txn_stats = {"commits": 0, "conflicts": 0, "retries": 0, "noops": 0, "failed": 0}
+
+def _sqlite_update_state(room_id, mutate, bump_version=True, max_retries=TXN_MAX_RETRIES, event="state_patched"):
+    stats = _txn_stats
+    for attempt in range(max_retries + 1):
+        if attempt:
+            stats["retries"] += 1
+            time.sleep(random.uniform(0, 0.005 * (2 ** attempt)))
+        try:
+            with get_db_connection() as conn:
+                c = conn.cursor()
+                base, key = _cached_snapshot(c, room_id, with_key=True)
+            if base is None:
+                _sqlite_init_db(room_id); continue
+            work = copy.deepcopy(base)
+            if mutate(work) is False:
+                stats["noops"] += 1
+                return None
+            if bump_version: work['version'] = key[0] + 1
+            with get_db_connection() as conn:
+                c = conn.cursor()
+                _write_delta(c, room_id, base, work, expect=key)
+                hitster_journal.append_event(_CountingCursor(c), room_id, event, base, work, key=(work['version'], key[1] + 1))
+            stats["commits"] += 1
+            return work
+        except StateConflict:
+            stats["conflicts"] += 1
+        except sqlite3.OperationalError:
+            # pl. "database is locked" a busy_timeout után is -> ugyanúgy újrapróbáljuk
+            stats["conflicts"] += 1
+    stats["failed"] += 1
+    return None
+
+class SqliteStateStore:
+    # az alap motor (lásd hitster_store); a memória motor write-behind célja is ez (restore / persist)
+    name = "sqlite"
+    txn_stats = _txn_stats
+
+    def init_room(self, room_id): _sqlite_init_db(room_id)
+    def load(self, room_id, fresh=False): return _sqlite_load_state(room_id, fresh=fresh)
+    def version(self, room_id): return _sqlite_version(room_id)
+    def evict(self, max_idle, keep=()): return _sqlite_evict(max_idle, keep)
+    def close(self): pass
+
+    def update(self, room_id, mutate, bump_version=True, max_retries=TXN_MAX_RETRIES, event="state_patched"):
+        return _sqlite_update_state(room_id, mutate, bump_version=bump_version, max_retries=max_retries, event=event)
+
+    def restore(self, room_id):
+        # a szoba utolsó kiírt állapota (ha nincs, most jön létre)
+        _sqlite_init_db(room_id)
+        with get_db_connection() as conn:
+            return _read_state(conn.cursor(), room_id)[0]
+
+    def persist(self, room_id, state, event):
+        # a memória motor teljes állapotát írja ki, delta a legutóbb kiírthoz képest (CAS nélkül, az a forrás)
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            c.execute("BEGIN IMMEDIATE")
+            old = _cached_snapshot(c, room_id)
+            _write_delta(c, room_id, old, state)
+            hitster_journal.append_event(_CountingCursor(c), room_id, event, old, state)
+
+    def store_stats(self):
+        return {"backend": self.name}
+
+# --- MOTOR VÁLASZTÁS + PUBLIKUS FÜGGVÉNYEK (ezeket hívja az app, a háttér szálak és a szimulátor) ---
+_store = {"engine": None, "config": None, "lock": threading.Lock()}
+
+def set_state_backend(name=None, flush_interval=None):
+    # idempotens: ugyanazzal a beállítással a meglévő motort adja vissza
+    config = (name or STATE_BACKEND, STATE_FLUSH_INTERVAL if flush_interval is None else flush_interval)
+    with _store["lock"]:
+        if _store["engine"] is not None and _store["config"] == config: return _store["engine"]
+        if config[0] not in ("sqlite", "memory"): raise ValueError(f"ismeretlen állapot tároló: {config[0]}")
+        if _store["engine"] is not None: _store["engine"].close()
+        if config[0] == "memory":
+            engine = MemoryStateStore(persist=SqliteStateStore() if config[1] else None, flush_interval=config[1])
+        else: engine = SqliteStateStore()
+        _store["engine"], _store["config"] = engine, config
+        return engine
+
+def get_state_store():
+    engine = _store["engine"]
+    if engine is not None: return engine
+    return set_state_backend(*(_store["config"] or ()))
+
+def get_txn_stats():
+    return get_state_store().txn_stats
+
+def init_db(room_id=DEFAULT_ROOM):
+    get_state_store().init_room(room_id)
+
+@hitster_metrics.timed("db.load_state_version")
+def load_state_version(room_id=DEFAULT_ROOM):
+    return get_state_store().version(room_id)
+
+@hitster_metrics.timed("db.load_state")
+def load_state(room_id=DEFAULT_ROOM, fresh=False):
+    # fresh=False: a közös snapshotot adja vissza -> CSAK OLVASÁSRA!
+    # fresh=True: saját, módosítható példány (írás előtt ezt kell használni)
+    return get_state_store().load(room_id, fresh=fresh)
+
+@hitster_metrics.timed("db.update_state")
+def update_state(room_id, mutate, bump_version=True, max_retries=TXN_MAX_RETRIES, event="state_patched"):
+    # a visszaadott új állapot is CSAK OLVASÁSRA (a memória motorban ez maga a tárolt példány)
+    return get_state_store().update(room_id, mutate, bump_version=bump_version, max_retries=max_retries, event=event)
+
+def evict_idle_rooms(max_idle=ROOM_IDLE_TTL):
+    # a törölt szobák id-i
+    rooms = get_state_store().evict(max_idle)
+    for room_id in rooms: hitster_metrics.drop_gauge("db_state_bytes", room=room_id)
+    return rooms
+
+# --- HÁTTÉR TAKARÍTÁS: a tétlen szobák törlése és a napló ritkítása nem a felhasználói futásban fut ---
+_janitor = {"thread": None, "lock": threading.Lock()}
+
+def start_room_janitor(interval=ROOM_EVICT_INTERVAL, on_evict=None):
+    # idempotens: folyamatonként egy háttérszál; on_evict(room_ids): a hívó szobánkénti adatainak eldobása
+    with _janitor["lock"]:
+        if _janitor["thread"] is not None: return _janitor["thread"]
+        def run():
+            while True:
+                try:
+                    rooms = evict_idle_rooms()
+                    if rooms and on_evict: on_evict(rooms)
+                except Exception as e: log.warning("Room eviction failed: %s", e)
+                time.sleep(interval)
+        _janitor["thread"] = threading.Thread(target=run, name="hitster-room-janitor", daemon=True)
+        _janitor["thread"].start()
+        return _janitor["thread"]
+
+def flush_state():
+    # memória motor: azonnali kiírás (pl. leállítás előtt); SQLite motornál nincs teendő
+    engine = get_state_store()
+    return engine.flush() if hasattr(engine, "flush") else 0
+
+def _state_cache_stats():
+    cache = get_state_cache()
+    total = cache["hits"] + cache["misses"]
+    return {"hits": cache["hits"], "misses": cache["misses"], "rooms": len(cache["rooms"]),
+            "hit_rate": round(cache["hits"] / total, 3) if total else None}
+
+def rebuild_state(room_id, upto=None):
+    # a naplóból visszajátszott állapot (hibakeresés / ellenőrzés), az élő sorokhoz nem nyúl
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        _ensure_schema(c)
+        return hitster_journal.rebuild_state(c, room_id, upto=upto)[0]
+
+def journal_stats():
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        _ensure_schema(c)
+        return hitster_journal.journal_stats(c)
+
+hitster_metrics.register_collector("db_pool", db_pool_stats)
+hitster_metrics.register_collector("db_txn", lambda: dict(get_txn_stats()))
+hitster_metrics.register_collector("state_store", lambda: get_state_store().store_stats())
+hitster_metrics.register_collector("db_writes", lambda: dict(_write_stats))
+hitster_metrics.register_collector("db_state_cache", _state_cache_stats)
+hitster_metrics.register_collector("journal", journal_stats)
@@ -0,0 +1,116 @@
+# --- 2. GAME LOGIC ENGINE ---
+# Tiszta játékszabályok: nincs Streamlit, nincs adatbázis, így a szimulátor is ugyanezt futtatja.
+import uuid
+
+def new_game_state(players=None, target_score=10, version=0):
+    return {
+        "version": version,
+        "game_phase": "LOBBY",
+        "players": list(players or []),
+        "timelines": {},
+        "deck": [],
+        "current_mystery_song": None,
+        "turn_index": 0,
+        "game_msg": "",
+        "fun_fact": "",
+        "success": False,
+        "waiting_for_reveal": False,
+        "reveal_processed": False,
+        "reveal_ui_shown": False,
+        "sound_trigger": None,
+        "sound_played": False,
+        "winner": None,
+        "target_score": target_score,
+        "last_revealed_song": None
+    }
+
+def check_guess_logic(timeline, song, pos):
+    if pos == 0:
+        if not timeline: return True
+        return timeline[0]['year'] >= song['year']
+    if pos == len(timeline):
+        return timeline[-1]['year'] <= song['year']
+    prev_card = timeline[pos-1]
+    next_card = timeline[pos]
+    return (prev_card['year'] <= song['year']) and (next_card['year'] >= song['year'])
+
+def current_player(state):
+    return state['players'][state['turn_index'] % len(state['players'])]
+
+def phone_poll_interval(state, me, fast, slow):
+    # a telefon verzió figyelésének üteme: ha ő jön (felfedés alatt: ha ő jön a következő körben), gyakrabban
+    if state.get('game_phase') not in ("GUESSING", "REVEAL") or not state.get('players'): return slow
+    upcoming = state['players'][(state['turn_index'] + (state['game_phase'] == "REVEAL")) % len(state['players'])]
+    return fast if upcoming == me or current_player(state) == me else slow
+
+def draw_card(state, card_for=None):
+    # a pakli elemei kártyák vagy (katalógusból feloldandó) id-k is lehetnek
+    item = state['deck'].pop()
+    return card_for(item) if card_for else item
+
+def deal_game(players, deck, target_score=10, version=0, fix_card=None, card_for=None):
+    # JÁTÉK START: mindenki kap egy kezdő kártyát, plusz az első rejtélyes dal (ehhez legalább játékos + 1 kártya kell)
+    if len(deck) < len(players) + 1: raise ValueError(f"kevés kártya: {len(deck)} ({len(players)} játékos + 1 kell)")
+    state = new_game_state(players=players, target_score=target_score, version=version)
+    state['game_phase'] = "GUESSING"
+    state['game_id'] = uuid.uuid4().hex[:12]  # a háttér feltöltés / dúsítás ezzel ismeri fel a saját játékát
+    state['timelines'] = {p: [] for p in state['players']}
+    state['deck'] = deck
+    for p in state['players']:
+        c = draw_card(state, card_for)
+        if fix_card: c = fix_card(c)
+        state['timelines'][p].append(c)
+    first = draw_card(state, card_for)
+    if fix_card: first = fix_card(first)
+    state['current_mystery_song'] = first
+    return state
+
+def resolve_turn(state, player, pos, fun_fact=None):
+    # Tipp + felfedés + győzelem egy lépésben, az update_state mutátorán belül hívandó.
+    # False, ha a tipp már nem érvényes (nem ő jön, már tippelt, más a dal).
+    if state.get('game_phase') != "GUESSING": return False
+    if not state['players'] or current_player(state) != player: return False
+    song = state['current_mystery_song']
+    timeline = state['timelines'][player]
+    if any(c['spotify_id'] == song['spotify_id'] for c in timeline): return False
+
+    state['success'] = check_guess_logic(timeline, song, pos)
+    if state['success']: timeline.insert(pos, song)
+    state['last_revealed_song'] = song
+    state['game_phase'] = "REVEAL"
+    state['waiting_for_reveal'] = False
+    state['reveal_processed'] = True
+    state['reveal_ui_shown'] = True
+    state['fun_fact'] = fun_fact or ""
+    state['sound_trigger'] = "success" if state['success'] else "fail"
+    state['sound_played'] = False
+
+    if len(timeline) >= state.get('target_score', 10):
+        state['game_phase'] = "VICTORY"
+        state['winner'] = player
+        state['sound_trigger'] = "win"
+    return True
+
+def mark_sound_played(state, trigger):
+    # a TV lejátszotta a `trigger` hangot; False, ha már jelezték, vagy közben új hang jött (azt még le kell játszani)
+    if state.get('sound_played') or state.get('sound_trigger') != trigger: return False
+    state['sound_played'] = True
+    return True
+
+def advance_round(state, card_for=None, turn_index=None):
+    # KÖVETKEZŐ KÖR; turn_index: a koppintás melyik körhöz szólt (nem a verzióhoz kötjük: a közben
+    # beírt fun fact / hang jelzés nem teszi érvénytelenné, egy másik TV-n már léptetett kört viszont nem léptet újra)
+    if state.get('game_phase') != "REVEAL": return False
+    if turn_index is not None and state['turn_index'] != turn_index: return False
+    state['turn_index'] += 1
+    if state['deck']:
+        state['current_mystery_song'] = draw_card(state, card_for)
+        state['game_phase'] = "GUESSING"
+        state['fun_fact'] = ""
+        state['last_revealed_song'] = None
+        state['sound_trigger'] = None
+        state['sound_played'] = False
+        state['reveal_processed'] = False
+        state['reveal_ui_shown'] = False
+    else: state['game_phase'] = "GAME_OVER"
+    return True
@@ -0,0 +1,170 @@
+# --- ESEMÉNYNAPLÓ (append-only) + IDŐSZAKOS SNAPSHOTOK ---
+# Minden update_state írás mellé, ugyanabban a tranzakcióban egy kis esemény kerül: a neve (player_added,
+# game_started, guess_made, round_advanced, ...) és a változás műveletekre bontva (beszúrás, hozzáfűzés,
+# levágás, egy elem cseréje), nem az egész állapot. Az állapot bármely pontra visszaállítható a legutóbbi
+# snapshotból + az utána jövő eseményekből; a szoba törlése / reset nem viszi el a történetet.
+#
+#   python hitster_journal.py ROOM            # események listája
+#   python hitster_journal.py ROOM --upto 42  # állapot a 42. esemény után
+import argparse
+import copy
+import json
+import time
+
+JOURNAL_SNAPSHOT_EVERY = 200        # ennyi esemény után új snapshot (gyorsabb visszajátszás)
+JOURNAL_SNAPSHOT_EVENTS = ("room_created", "game_started", "game_reset", "state_restored")  # ezek után mindig
+JOURNAL_TTL = 14 * 24 * 3600        # ennyi idő után törlődik a napló (mp)
+MAX_ITEM_OPS = 4                    # ennél több elemcsere egy listában -> inkább az egész lista
+
+# a folyamat által írt napló mennyisége (a mérőszámokhoz; a tábla végigolvasása 14 napnyi naplónál drága)
+_written = {"events": 0, "event_bytes": 0, "snapshots": 0, "snapshot_bytes": 0}
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS game_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, room_id TEXT NOT NULL, version INTEGER, rev INTEGER,
+    type TEXT NOT NULL, ops TEXT NOT NULL, created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_game_events_room ON game_events (room_id, id);
+CREATE INDEX IF NOT EXISTS idx_game_events_created ON game_events (created_at);
+CREATE TABLE IF NOT EXISTS game_snapshots (
+    room_id TEXT NOT NULL, event_id INTEGER NOT NULL, state TEXT NOT NULL, created_at REAL NOT NULL,
+    PRIMARY KEY (room_id, event_id)
+);
+'''
+
+# --- DIFF: régi -> új állapot műveletlistaként ---
+def _list_ops(path, before, after):
+    if before == after: return []
+    n, m = len(before), len(after)
+    if m < n and after == before[:m]: return [["trunc", path, m]]
+    if m > n and after[:n] == before: return [["extend", path, after[n:]]]
+    if m == n + 1:
+        i = 0
+        while i < n and before[i] == after[i]: i += 1
+        if before[i:] == after[i + 1:]: return [["insert", path, i, after[i]]]
+    common = min(n, m)
+    changed = [i for i in range(common) if before[i] != after[i]]
+    if len(changed) <= MAX_ITEM_OPS:
+        ops = [["item", path, i, after[i]] for i in changed]
+        if m < n: ops.append(["trunc", path, m])
+        elif m > n: ops.append(["extend", path, after[n:]])
+        return ops
+    return [["set", path, after]]
+
+def diff_ops(old, new):
+    # a felső szintű egyszerű mezők egyetlen "merge" műveletbe kerülnek (version, game_phase, turn_index, ...)
+    ops, merged = [], {}
+    for key in list(old) + [k for k in new if k not in old]:
+        if key not in new:
+            ops.append(["del", [key]]); continue
+        before, after = old.get(key), new[key]
+        if key in old and before == after: continue
+        if key in old and isinstance(before, list) and isinstance(after, list):
+            ops += _list_ops([key], before, after)
+        elif key == "timelines" and isinstance(before, dict) and isinstance(after, dict):
+            for p in list(before) + [p for p in after if p not in before]:
+                if p not in after: ops.append(["del", [key, p]])
+                elif p not in before: ops.append(["set", [key, p], after[p]])
+                else: ops += _list_ops([key, p], before[p], after[p])
+        else:
+            merged[key] = after
+    return ([["merge", [], merged]] if merged else []) + ops
+
+def apply_ops(state, ops):
+    for op in ops:
+        kind, path = op[0], op[1]
+        if kind == "merge":
+            state.update(copy.deepcopy(op[2])); continue
+        parent = state
+        for part in path[:-1]: parent = parent[part]
+        last = path[-1]
+        if kind == "set": parent[last] = copy.deepcopy(op[2])
+        elif kind == "del": parent.pop(last, None)
+        elif kind == "trunc": del parent[last][op[2]:]
+        elif kind == "extend": parent[last].extend(copy.deepcopy(op[2]))
+        elif kind == "insert": parent[last].insert(op[2], copy.deepcopy(op[3]))
+        elif kind == "item": parent[last][op[2]] = copy.deepcopy(op[3])
+        else: raise ValueError(f"ismeretlen napló művelet: {kind}")
+    return state
+
+# --- ÍRÁS (a hívó tranzakciójában) ---
+def append_event(c, room_id, event, old, new, key=None, force_snapshot=False):
+    ops = json.dumps(diff_ops(old or {}, new), ensure_ascii=False, separators=(',', ':'))
+    c.execute("INSERT INTO game_events (room_id, version, rev, type, ops, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+              (room_id, new.get('version'), key[1] if key else None, event, ops, time.time()))
+    event_id = c.lastrowid
+    _written["events"] += 1
+    _written["event_bytes"] += len(ops)
+    if force_snapshot or event in JOURNAL_SNAPSHOT_EVENTS or _events_since_snapshot(c, room_id) >= JOURNAL_SNAPSHOT_EVERY:
+        state = json.dumps(new, ensure_ascii=False, separators=(',', ':'))
+        c.execute("INSERT OR REPLACE INTO game_snapshots (room_id, event_id, state, created_at) VALUES (?, ?, ?, ?)",
+                  (room_id, event_id, state, time.time()))
+        _written["snapshots"] += 1
+        _written["snapshot_bytes"] += len(state)
+    return event_id
+
+def _events_since_snapshot(c, room_id):
+    last = c.execute("SELECT MAX(event_id) FROM game_snapshots WHERE room_id=?", (room_id,)).fetchone()[0]
+    return c.execute("SELECT count(*) FROM game_events WHERE room_id=? AND id > ?", (room_id, last or 0)).fetchone()[0]
+
+def prune(c, max_age=JOURNAL_TTL):
+    # régi napló törlése úgy, hogy ami marad, az továbbra is visszajátszható legyen:
+    # a régóta csendes szobák teljesen mennek, az aktívaknál csak a legutolsó régi snapshot előtti rész
+    cutoff = time.time() - max_age
+    idle = "SELECT room_id FROM game_events GROUP BY room_id HAVING MAX(created_at) < ?"
+    c.execute(f"DELETE FROM game_snapshots WHERE room_id IN ({idle})", (cutoff,))
+    c.execute(f"DELETE FROM game_events WHERE room_id IN ({idle})", (cutoff,))
+    removed = c.rowcount
+    old = c.execute("SELECT room_id, MAX(event_id) FROM game_snapshots WHERE created_at < ? GROUP BY room_id", (cutoff,)).fetchall()
+    for room_id, event_id in old:
+        c.execute("DELETE FROM game_events WHERE room_id=? AND id < ?", (room_id, event_id))
+        removed += c.rowcount
+        c.execute("DELETE FROM game_snapshots WHERE room_id=? AND event_id < ?", (room_id, event_id))
+    return removed
+
+# --- OLVASÁS / VISSZAJÁTSZÁS ---
+def rebuild_state(c, room_id, upto=None):
+    # (állapot, utolsó esemény id) a legutóbbi snapshot + az utána jövő események alapján; (None, None), ha nincs napló
+    upto = upto if upto is not None else c.execute("SELECT MAX(id) FROM game_events WHERE room_id=?", (room_id,)).fetchone()[0]
+    if upto is None: return None, None
+    snap = c.execute("SELECT event_id, state FROM game_snapshots WHERE room_id=? AND event_id <= ? ORDER BY event_id DESC LIMIT 1",
+                     (room_id, upto)).fetchone()
+    state, start = (json.loads(snap[1]), snap[0]) if snap else ({}, 0)
+    for (ops,) in c.execute("SELECT ops FROM game_events WHERE room_id=? AND id > ? AND id <= ? ORDER BY id", (room_id, start, upto)):
+        apply_ops(state, json.loads(ops))
+    return state, upto
+
+def list_events(c, room_id, limit=None):
+    sql = "SELECT id, version, rev, type, length(ops), created_at FROM game_events WHERE room_id=? ORDER BY id"
+    rows = c.execute(sql + (" DESC LIMIT ?" if limit else ""), (room_id, limit) if limit else (room_id,)).fetchall()
+    return rows[::-1] if limit else rows
+
+def journal_stats(c):
+    # gyűjtőként fut: csak indexből olvasható értékek (a legutolsó esemény id-je, a snapshotok száma),
+    # a méretek a folyamat indulása óta írt mennyiségek
+    last_id = c.execute("SELECT COALESCE(MAX(id), 0) FROM game_events").fetchone()[0]
+    snaps = c.execute("SELECT count(*) FROM game_snapshots").fetchone()[0]
+    w = dict(_written)
+    return {"last_event_id": last_id, "snapshots": snaps, "written_events": w["events"], "written_event_bytes": w["event_bytes"],
+            "avg_event_bytes": round(w["event_bytes"] / w["events"], 1) if w["events"] else None,
+            "written_snapshots": w["snapshots"], "written_snapshot_bytes": w["snapshot_bytes"]}
+
+def main(argv=None):
+    import hitster_db
+    ap = argparse.ArgumentParser(description="Hitster eseménynapló visszajátszás")
+    ap.add_argument("room")
+    ap.add_argument("--db", default=hitster_db.DB_FILE)
+    ap.add_argument("--upto", type=int, help="állapot ennél az esemény id-nél")
+    args = ap.parse_args(argv)
+    hitster_db.set_db_file(args.db)
+    with hitster_db.get_db_connection() as conn:
+        c = conn.cursor()
+        if args.upto is None:
+            for event_id, version, rev, kind, size, created in list_events(c, args.room):
+                print(f"{event_id:>8}  {time.strftime('%H:%M:%S', time.localtime(created))}  v{version} r{rev}  {kind:<16} {size} B")
+            return
+        state, _ = rebuild_state(c, args.room, upto=args.upto)
+    print(json.dumps(state, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+# --- TERHELÉSES TESZT: 1 TV + N telefon párhuzamosan ugyanazon a szobán ---
+# A valódi hitster_db / hitster_engine függvényeit hajtja szálakból vagy külön folyamatokból, Spotify és Groq
+# helyett a szimulátor helyettesítőivel. A TV a fragmenthez hasonlóan a verziót figyeli, felfedéskor
+# hangot jelez és KÖVETKEZŐ KÖR-t nyom; a telefonok a phone_watcher-hez hasonlóan a verziót kérdezik le
+# (ha ők jönnek, gyakrabban), a teljes állapotot csak változáskor töltik be, és ha soruk van, tippelnek
+# (olykor dupla koppintással). A végén ellenőrzi, hogy egy tipp / kör sem veszett el és egyik sem futott le kétszer.
+#
+#   python hitster_load.py --phones 10 --duration 30
+#   python hitster_load.py --phones 20 --mode process --tv-refresh 0.2 --phone-poll-fast 0.3 --phone-poll-slow 1 --think 0 --json load.json
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import tempfile
+import threading
+import time
+
+import hitster_db
+from hitster_engine import (
+    new_game_state, current_player, deal_game, resolve_turn, advance_round, mark_sound_played, phone_poll_interval,
+)
+from hitster_sim import OpStats, fake_spotify_tracks, fake_fix_card, fake_fun_fact, make_guesser
+
+LOAD_ROOM = "load"
+TERMINAL_PHASES = ("VICTORY", "GAME_OVER")
+
+def _pause(rng, interval, deadline=None):
+    # ±50% szórás, hogy a kliensek ne egy ütemre kopogjanak; a futás végén túl nem alszik
+    if not interval: return
+    pause = interval * rng.uniform(0.5, 1.5)
+    time.sleep(max(0.0, min(pause, deadline - time.time())) if deadline else pause)
+
+def _txn_delta(before):
+    return {k: hitster_db.get_txn_stats()[k] - before[k] for k in before}
+
+def _summary(state):
+    # a játék végállapota az ellenőrzéshez
+    return {"game_id": state.get('game_id'), "phase": state.get('game_phase'), "players": len(state.get('players', [])),
+            "cards": sum(len(tl) for tl in state.get('timelines', {}).values()), "turn_index": state.get('turn_index', 0)}
+
+# --- SZEREPLŐK ---
+def phone_actor(cfg, name, seed, deadline):
+    hitster_db.set_db_file(cfg['db'])  # process módban a gyerek folyamatnak kell, szál módban nem csinál semmit
+    rng, stats, txn_before = random.Random(seed), OpStats(), dict(hitster_db.get_txn_stats())
+    guess = make_guesser(cfg['guesser'], rng, accuracy=cfg['accuracy'])
+    room, state, guesses, rejected = cfg['room'], None, [], 0
+
+    while time.time() < deadline:
+        # phone_watcher: verzió lekérdezés, a teljes állapot csak változáskor
+        current = stats.timed("load_state_version", hitster_db.load_state_version, room)
+        if state is None or (current and current[0] != state['version']):
+            state = stats.timed("load_state", hitster_db.load_state, room)
+        if state.get('game_phase') == "GUESSING" and state['players'] and current_player(state) == name:
+            song = state['current_mystery_song']
+            _pause(rng, cfg['think'])
+            fun_fact = fake_fun_fact(song['artist'], song['title'], latency=cfg['ai_latency'])
+            pos = guess(state['timelines'][name], song)
+            def apply_guess(s):
+                if s['current_mystery_song']['spotify_id'] != song['spotify_id']: return False
+                return resolve_turn(s, name, pos, fun_fact)
+            # dupla koppintás: két egyidejű tipp ugyanarra a dalra, legfeljebb egy mehet át
+            taps = 2 if rng.random() < cfg['double_tap'] else 1
+            results = []
+            def tap():
+                new = stats.timed("guess", hitster_db.update_state, room, apply_guess, event="guess_made")
+                results.append(new)
+            threads = [threading.Thread(target=tap) for _ in range(taps)]
+            for t in threads: t.start()
+            for t in threads: t.join()
+            for new in results:
+                if new is None: rejected += 1
+                else: guesses.append([new.get('game_id'), song['spotify_id'], bool(new.get('success'))])
+            state = stats.timed("load_state", hitster_db.load_state, room)  # tipp után st.rerun(): teljes futás
+        _pause(rng, phone_poll_interval(state, name, cfg['phone_poll_fast'], cfg['phone_poll_slow']), deadline)
+    return {"role": "phone", "ops": stats.samples, "txn": _txn_delta(txn_before), "guesses": guesses, "rejected": rejected}
+
+def tv_actor(cfg, seed, deadline):
+    hitster_db.set_db_file(cfg['db'])
+    rng, stats, txn_before = random.Random(seed), OpStats(), dict(hitster_db.get_txn_stats())
+    room, state, games, advances = cfg['room'], None, [], {}
+    update = lambda name, fn, **kw: stats.timed(name, hitster_db.update_state, room, fn, **kw)
+
+    while time.time() < deadline:
+        current = stats.timed("load_state_version", hitster_db.load_state_version, room)  # auto_reveal_watcher
+        if state is None or (current and current[0] != state['version']):
+            state = stats.timed("load_state", hitster_db.load_state, room)  # st.rerun(): teljes futás
+        phase = state.get('game_phase')
+        missing = [f"T{i + 1}" for i in range(cfg['phones']) if f"T{i + 1}" not in state.get('players', [])]
+        if phase == "LOBBY" and missing:
+            # a TV admin egyesével veszi fel a játékosokat (mindegyik külön írás), a telefonok a listából választanak
+            for name in missing:
+                def add_player(s, p=name):
+                    if s['game_phase'] != "LOBBY" or p in s['players']: return False
+                    s['players'].append(p)
+                update("add_player", add_player, event="player_added")
+            state = None
+        elif phase == "LOBBY":
+            players = list(state['players'])
+            deck = fake_spotify_tracks(cfg['deck'], rng)
+            rng.shuffle(deck)
+            dealt = deal_game(players, deck, target_score=cfg['target'], fix_card=lambda c: fake_fix_card(c, rng, latency=cfg['ai_latency']))
+            def start_game(s):
+                if s['game_phase'] != "LOBBY" or s['players'] != players: return False
+                dealt['version'] = s['version']
+                s.clear(); s.update(dealt)
+            update("start_game", start_game, event="game_started")
+            state = None
+        elif phase == "REVEAL":
+            # ugyanazok a mutátorok, mint a TV-n (hitster_engine)
+            played_trigger, round_turn = state.get('sound_trigger'), state['turn_index']
+            update("sound_played", lambda s: mark_sound_played(s, played_trigger), bump_version=False, event="sound_played")
+            _pause(rng, cfg['reveal_hold'])
+            advanced = update("next_round", lambda s: advance_round(s, turn_index=round_turn), event="round_advanced")
+            if advanced: advances[advanced.get('game_id')] = advances.get(advanced.get('game_id'), 0) + 1
+            state = None
+        elif phase in TERMINAL_PHASES:
+            games.append(_summary(state))
+            stats.timed("reset_db", hitster_db.reset_db, room)
+            state = None
+        _pause(rng, cfg['tv_refresh'])
+    return {"role": "tv", "ops": stats.samples, "txn": _txn_delta(txn_before), "games": games, "advances": advances}
+
+def _process_main(queue, fn, args):
+    queue.put(fn(*args))
+
+# --- FUTTATÁS + ELLENŐRZÉS ---
+def verify(games, guesses, advances):
+    # játékonként: kártyák = kezdő lapok + talált tippek, turn_index = kör váltások, tipp = kör váltás (+1 ha épp felfedés)
+    per_game, seen, duplicates = {}, set(), 0
+    for game_id, song_id, success in guesses:
+        if (game_id, song_id) in seen: duplicates += 1
+        seen.add((game_id, song_id))
+        g = per_game.setdefault(game_id, {"guesses": 0, "correct": 0})
+        g["guesses"] += 1
+        g["correct"] += success
+    problems = []
+    for game in games:
+        g = per_game.get(game['game_id'], {"guesses": 0, "correct": 0})
+        adv = advances.get(game['game_id'], 0)
+        expected_guesses = adv + (1 if game['phase'] in ("REVEAL", "VICTORY") else 0)
+        if game['cards'] != game['players'] + g["correct"]:
+            problems.append({"game_id": game['game_id'], "kind": "cards", "expected": game['players'] + g["correct"], "actual": game['cards']})
+        if game['turn_index'] != adv:
+            problems.append({"game_id": game['game_id'], "kind": "rounds", "expected": adv, "actual": game['turn_index']})
+        if g["guesses"] != expected_guesses:
+            problems.append({"game_id": game['game_id'], "kind": "guesses", "expected": expected_guesses, "actual": g["guesses"]})
+    return {"games_checked": len(games), "lost_updates": len(problems), "double_applied": duplicates, "problems": problems[:20]}
+
+def run_load(phones=10, duration=30.0, mode="thread", tv_refresh=1.0, phone_poll_fast=1.0, phone_poll_slow=4.0, think=0.5, reveal_hold=0.5,
+             double_tap=0.1, deck=80, target=10, guesser="random", accuracy=0.5, ai_latency=0.0, seed=1, db_file=None,
+             backend=None, flush_interval=None):
+    tmp = None
+    if not db_file:
+        tmp = tempfile.mkdtemp(prefix="hitster_load_")
+        db_file = os.path.join(tmp, "load.db")
+    cfg = {"db": db_file, "room": LOAD_ROOM, "phones": phones, "tv_refresh": tv_refresh,
+           "phone_poll_fast": phone_poll_fast, "phone_poll_slow": phone_poll_slow,
+           "think": think, "reveal_hold": reveal_hold, "double_tap": double_tap, "deck": deck, "target": target,
+           "guesser": guesser, "accuracy": accuracy, "ai_latency": ai_latency}
+    hitster_db.set_db_file(db_file)  # előbb a fájl, hogy a motor egyszer, már az új fájlra épüljön fel
+    hitster_db.set_state_backend(backend, flush_interval)
+    if mode == "process" and hitster_db.get_state_store().name != "sqlite":
+        raise ValueError("a memória tároló folyamatonként külön van, --mode process csak SQLite-tal értelmes")
+    hitster_db.init_db(LOAD_ROOM)
+    hitster_db.update_state(LOAD_ROOM, lambda s: s.update(new_game_state(version=s["version"])), event="game_reset")
+
+    deadline = time.time() + duration
+    jobs = [(tv_actor, (cfg, seed, deadline))] + [(phone_actor, (cfg, f"T{i + 1}", seed * 1000 + i, deadline)) for i in range(phones)]
+    txn_before = dict(hitster_db.get_txn_stats())
+    t0 = time.perf_counter()
+    if mode == "process":
+        ctx = multiprocessing.get_context("spawn")
+        queue = ctx.Queue()
+        procs = [ctx.Process(target=_process_main, args=(queue, fn, args)) for fn, args in jobs]
+        for p in procs: p.start()
+        results = [queue.get() for _ in procs]
+        for p in procs: p.join()
+        txn = {k: sum(r['txn'][k] for r in results) for k in txn_before}
+    else:
+        results = []
+        def run(fn, args): results.append(fn(*args))
+        threads = [threading.Thread(target=run, args=job) for job in jobs]
+        for t in threads: t.start()
+        for t in threads: t.join()
+        txn = _txn_delta(txn_before)  # a szálak közös számlálót növelnek
+    elapsed = time.perf_counter() - t0
+
+    tv = next(r for r in results if r['role'] == "tv")
+    phone_results = [r for r in results if r['role'] == "phone"]
+    guesses = [g for r in phone_results for g in r['guesses']]
+    final = _summary(hitster_db.load_state(LOAD_ROOM))
+    games = tv['games'] + ([final] if final['game_id'] and final['game_id'] not in {g['game_id'] for g in tv['games']} else [])
+
+    stats = OpStats()
+    for r in results:
+        for name, xs in r['ops'].items(): stats.samples.setdefault(name, []).extend(xs)
+    ops = sum(len(xs) for xs in stats.samples.values())
+    attempts = txn['commits'] + txn['conflicts']
+    return {
+        "config": {k: v for k, v in cfg.items() if k not in ("db", "room")} | {"mode": mode, "duration": duration, "seed": seed,
+                                                                              "backend": hitster_db.get_state_store().name},
+        "elapsed_s": elapsed,
+        "ops": ops,
+        "ops_per_sec": ops / elapsed if elapsed else 0.0,
+        "commits_per_sec": txn['commits'] / elapsed if elapsed else 0.0,
+        "turns": len(guesses),
+        "turns_per_sec": len(guesses) / elapsed if elapsed else 0.0,
+        "rejected_guesses": sum(r['rejected'] for r in phone_results),
+        "txn": txn,
+        "conflict_rate": txn['conflicts'] / attempts if attempts else 0.0,
+        "check": verify(games, guesses, tv['advances']),
+        "latency": stats.summary(),
+    }
+
+def print_report(r):
+    c, chk = r['config'], r['check']
+    print(f"\n== 1 TV + {c['phones']} telefon | {c['mode']} | {c['backend']} | TV {c['tv_refresh']}s, telefon {c['phone_poll_fast']}/{c['phone_poll_slow']}s, gondolkodás {c['think']}s ==")
+    print(f"idő: {r['elapsed_s']:.1f}s   műveletek: {r['ops']} ({r['ops_per_sec']:.0f}/s)   írások: {r['commits_per_sec']:.1f}/s   körök: {r['turns']} ({r['turns_per_sec']:.2f}/s)")
+    print(f"tranzakciók: {r['txn']}   ütközési arány: {r['conflict_rate']:.1%}   elutasított tipp: {r['rejected_guesses']}")
+    print(f"ellenőrzés: {chk['games_checked']} játék, elveszett frissítés: {chk['lost_updates']}, kétszer lefutott tipp: {chk['double_applied']}")
+    for p in chk['problems']: print(f"  ! {p}")
+    print(f"{'művelet':<20}{'db':>8}{'átlag':>10}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}  (ms)")
+    for name, s in r['latency'].items():
+        print(f"{name:<20}{s['count']:>8}{s['mean_ms']:>10.3f}{s['p50_ms']:>10.3f}{s['p90_ms']:>10.3f}{s['p99_ms']:>10.3f}{s['max_ms']:>10.3f}")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Hitster terheléses teszt (1 TV + N telefon)")
+    ap.add_argument("--phones", type=int, default=10)
+    ap.add_argument("--duration", type=float, default=30, help="futási idő (mp)")
+    ap.add_argument("--mode", choices=["thread", "process"], default="thread",
+                    help="thread: egy szerver folyamat sok munkamenettel; process: külön folyamatok egy DB fájlon")
+    ap.add_argument("--tv-refresh", type=float, default=1.0, help="a TV verzió figyelés periódusa (mp)")
+    ap.add_argument("--phone-poll-fast", type=float, default=1.0, help="telefon verzió figyelés, ha ő jön / ő jön következőnek (mp)")
+    ap.add_argument("--phone-poll-slow", type=float, default=4.0, help="telefon verzió figyelés egyébként (mp)")
+    ap.add_argument("--think", type=float, default=0.5, help="gondolkodási idő tippelés előtt (mp)")
+    ap.add_argument("--reveal-hold", type=float, default=0.5, help="ennyi ideig áll a felfedés a TV-n (mp)")
+    ap.add_argument("--double-tap", type=float, default=0.1, help="dupla koppintás valószínűsége tippnél")
+    ap.add_argument("--deck", type=int, default=80)
+    ap.add_argument("--target", type=int, default=10)
+    ap.add_argument("--guesser", choices=["random", "perfect", "accuracy"], default="random")
+    ap.add_argument("--accuracy", type=float, default=0.5)
+    ap.add_argument("--ai-latency", type=float, default=0.0, help="szimulált Groq késleltetés (mp)")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--db", help="SQLite fájl (alapból ideiglenes)")
+    ap.add_argument("--backend", choices=["sqlite", "memory"], help="állapot tároló (alapból HITSTER_STATE_BACKEND / sqlite)")
+    ap.add_argument("--flush-interval", type=float, help="memory: write-behind periódus (mp), 0 = nincs kiírás")
+    ap.add_argument("--json", help="eredmény mentése JSON-ba")
+    args = ap.parse_args(argv)
+
+    r = run_load(phones=args.phones, duration=args.duration, mode=args.mode, tv_refresh=args.tv_refresh,
+                 phone_poll_fast=args.phone_poll_fast, phone_poll_slow=args.phone_poll_slow, think=args.think, reveal_hold=args.reveal_hold, double_tap=args.double_tap,
+                 deck=args.deck, target=args.target, guesser=args.guesser, accuracy=args.accuracy,
+                 ai_latency=args.ai_latency, seed=args.seed, db_file=args.db, backend=args.backend,
+                 flush_interval=args.flush_interval)
+    print_report(r)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f: json.dump(r, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+# --- HELYI MÉDIA (albumborító bélyegképek + hangeffektek) ---
+# A borítót egyszer töltjük le, kijelző méretenként kicsinyítve a static/ mappába mentjük, és a Streamlit
+# statikus kiszolgálása (server.enableStaticServing) adja a böngészőknek. Amíg nincs kész, a távoli URL marad.
+import hashlib
+import logging
+import os
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import hitster_metrics
+
+log = logging.getLogger(__name__)
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+STATIC_URL = "app/static"
+THUMB_DIR = "covers"
+SOUND_DIR = "sounds"
+
+PLACEHOLDER_IMAGE = "https://via.placeholder.com/150"  # régi kártyákon még ez szerepelhet
+
+# a CSS méret duplája (retina kijelzők)
+THUMB_SIZES = {"tv": 300, "mobile": 100, "large": 640}
+THUMB_QUALITY = 80
+DOWNLOAD_TIMEOUT = 5
+MEDIA_WORKERS = 4
+MAX_DOWNLOAD_BYTES = 5 * 1024 * 1024
+
+SOUNDS = {
+    "success": "https://www.myinstants.com/media/sounds/correct.mp3",
+    "fail": "https://www.myinstants.com/media/sounds/wrong-answer-sound-effect.mp3",
+    "win": "https://www.myinstants.com/media/sounds/tada-fanfare-a.mp3",
+    "gameover": "https://www.myinstants.com/media/sounds/spongebob-fail.mp3"
+}
+
+_executor = ThreadPoolExecutor(max_workers=MEDIA_WORKERS, thread_name_prefix="hitster-media")
+_lock = threading.Lock()
+_pending = set()   # folyamatban lévő letöltések (url / hang név)
+_failed = set()    # ezeket nem próbáljuk újra ebben a folyamatban
+_ready = set()     # kész fájlok relatív útvonala (ne kelljen minden rendernél stat-olni)
+_stats = {"downloads": 0, "failed": 0, "bytes_in": 0, "bytes_out": 0}
+
+def _rel(kind, name):
+    return f"{kind}/{name}"
+
+def _exists(rel):
+    if rel in _ready: return True
+    if os.path.exists(os.path.join(STATIC_DIR, rel)):
+        _ready.add(rel)
+        return True
+    return False
+
+def _save_atomic(rel, data):
+    path = os.path.join(STATIC_DIR, rel)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f: f.write(data)
+    os.replace(tmp, path)
+    _ready.add(rel)
+
+def _download(url):
+    req = urllib.request.Request(url, headers={"User-Agent": "hitster-party"})
+    with urllib.request.urlopen(req, timeout=DOWNLOAD_TIMEOUT) as resp:
+        data = resp.read(MAX_DOWNLOAD_BYTES + 1)
+    if len(data) > MAX_DOWNLOAD_BYTES: raise ValueError("túl nagy fájl")
+    return data
+
+def _thumb_name(url, size):
+    return f"{hashlib.sha1(url.encode('utf-8')).hexdigest()[:20]}_{size}.jpg"
+
+def _render(img, size):
+    from PIL import Image, ImageOps
+    out = BytesIO()
+    ImageOps.fit(img.convert("RGB"), (size, size), Image.LANCZOS).save(out, "JPEG", quality=THUMB_QUALITY, optimize=True)
+    return out.getvalue()
+
+def _fetch_cover(url):
+    try:
+        from PIL import Image  # csak a háttér letöltő szálakban kell
+        with hitster_metrics.timer("media.cover_download"): raw = _download(url)
+        img = Image.open(BytesIO(raw))
+        img.load()
+        written = 0
+        for size in THUMB_SIZES.values():
+            data = _render(img, size)
+            _save_atomic(_rel(THUMB_DIR, _thumb_name(url, size)), data)
+            written += len(data)
+        with _lock:
+            _stats["downloads"] += 1
+            _stats["bytes_in"] += len(raw)
+            _stats["bytes_out"] += written
+    except Exception as e:
+        log.warning("Cover download failed (%s): %s", url, e)
+        with _lock:
+            _failed.add(url)
+            _stats["failed"] += 1
+    finally:
+        with _lock: _pending.discard(url)
+
+def _is_remote(url):
+    return bool(url) and url.startswith(("http://", "https://")) and url != PLACEHOLDER_IMAGE
+
+def warm_covers(cards):
+    # a pakli betöltésekor hívjuk: a hiányzó borítók a háttérben letöltődnek és kicsinyítődnek
+    for card in cards:
+        url = card.get('image') if card else None
+        if not _is_remote(url) or _exists(_rel(THUMB_DIR, _thumb_name(url, THUMB_SIZES["tv"]))): continue
+        with _lock:
+            if url in _pending or url in _failed: continue
+            _pending.add(url)
+        _executor.submit(_fetch_cover, url)
+
+def placeholder_path():
+    rel = _rel(THUMB_DIR, "placeholder.png")
+    if not _exists(rel):
+        from PIL import Image, ImageDraw
+        size = THUMB_SIZES["tv"]
+        img = Image.new("RGB", (size, size), "#2d2b55")
+        ImageDraw.Draw(img).ellipse((size // 4, size // 4, size * 3 // 4, size * 3 // 4), outline="#1DB954", width=8)
+        out = BytesIO()
+        img.save(out, "PNG")
+        _save_atomic(rel, out.getvalue())
+    return rel
+
+def cover_url(card, size="tv"):
+    # HTML-be (img src) ágyazható URL: helyi bélyegkép, ha kész; különben a távoli kép (és letöltés indul)
+    url = card.get('image') if card else None
+    if not _is_remote(url): return f"{STATIC_URL}/{placeholder_path()}"
+    rel = _rel(THUMB_DIR, _thumb_name(url, THUMB_SIZES[size]))
+    if _exists(rel): return f"{STATIC_URL}/{rel}"
+    warm_covers([card])
+    return url
+
+def cover_image(card, size="large"):
+    # st.image-nek: helyi fájl útvonal, ha kész; különben a távoli URL
+    url = card.get('image') if card else None
+    if not _is_remote(url): return os.path.join(STATIC_DIR, placeholder_path())
+    rel = _rel(THUMB_DIR, _thumb_name(url, THUMB_SIZES[size]))
+    if _exists(rel): return os.path.join(STATIC_DIR, rel)
+    warm_covers([card])
+    return url
+
+def _fetch_sound(name):
+    try:
+        data = _download(SOUNDS[name])
+        _save_atomic(_rel(SOUND_DIR, f"{name}.mp3"), data)
+        with _lock: _stats["bytes_in"] += len(data)
+    except Exception as e:
+        log.warning("Sound download failed (%s): %s", name, e)
+        with _lock: _failed.add(name)
+    finally:
+        with _lock: _pending.discard(name)
+
+def sound_url(name):
+    # a static/sounds alatti mp3 (egyszer letöltve vagy kézzel odamásolva); amíg nincs meg, a távoli URL
+    if name not in SOUNDS: return None
+    rel = _rel(SOUND_DIR, f"{name}.mp3")
+    if _exists(rel): return f"{STATIC_URL}/{rel}"
+    with _lock:
+        start = name not in _pending and name not in _failed
+        if start: _pending.add(name)
+    if start: _executor.submit(_fetch_sound, name)
+    return SOUNDS[name]
+
+def warm_sounds():
+    for name in SOUNDS: sound_url(name)
+
+def media_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats["pending"] = len(_pending)
+    stats["cached_files"] = len(_ready)
+    return stats
+
+hitster_metrics.register_collector("media", media_stats)
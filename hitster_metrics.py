@@ -0,0 +1,174 @@
+# --- MÉRÉSEK (késleltetés hisztogramok, számlálók, mérők) + JSON / Prometheus export ---
+# Folyamat-szintű, szálbiztos, függőség nélküli; a többi modul ide jelent, a TV admin panel és az
+# exportált fájlok innen olvasnak. A modulok saját statisztikáit gyűjtőként (collector) lehet bekötni.
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+log = logging.getLogger(__name__)
+
+# hisztogram határok (mp) - a Prometheus "le" címkéi
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRICS_DIR = "metrics"
+METRICS_EXPORT_INTERVAL = 30  # mp, a háttér export ennyi időnként írja ki a fájlokat
+
+_lock = threading.Lock()
+_histograms = {}  # (név, címkék) -> {"count", "sum", "max", "buckets": [...]}
+_counters = {}    # (név, címkék) -> szám
+_gauges = {}      # (név, címkék) -> szám
+_collectors = {}  # név -> fn() -> {kulcs: szám}
+_exporter = {"thread": None}
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+def observe(name, seconds, **labels):
+    key = _key(name, labels)
+    with _lock:
+        h = _histograms.get(key)
+        if h is None: h = _histograms[key] = {"count": 0, "sum": 0.0, "max": 0.0, "buckets": [0] * (len(BUCKETS) + 1)}
+        h["count"] += 1
+        h["sum"] += seconds
+        h["max"] = max(h["max"], seconds)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                h["buckets"][i] += 1
+                break
+        else: h["buckets"][-1] += 1
+
+@contextmanager
+def timer(name, **labels):
+    t0 = time.perf_counter()
+    try: yield
+    finally: observe(name, time.perf_counter() - t0, **labels)
+
+def timed(name, **labels):
+    # dekorátor: a függvény minden hívásának ideje a `name` hisztogramba kerül
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            t0 = time.perf_counter()
+            try: return fn(*args, **kwargs)
+            finally: observe(name, time.perf_counter() - t0, **labels)
+        return inner
+    return wrap
+
+def inc(name, n=1, **labels):
+    key = _key(name, labels)
+    with _lock: _counters[key] = _counters.get(key, 0) + n
+
+def set_gauge(name, value, **labels):
+    with _lock: _gauges[_key(name, labels)] = value
+
+def drop_gauge(name, **labels):
+    # pl. a törölt szoba mérője ne maradjon meg (és ne exportálódjon) örökre
+    with _lock: _gauges.pop(_key(name, labels), None)
+
+def register_collector(name, fn):
+    _collectors[name] = fn
+
+def _quantile(h, q):
+    # felső becslés a vödrökből (a vödör felső határa)
+    if not h["count"]: return None
+    target, seen = q * h["count"], 0
+    for i, n in enumerate(h["buckets"]):
+        seen += n
+        if seen >= target: return BUCKETS[i] if i < len(BUCKETS) else h["max"]
+    return h["max"]
+
+def _label_str(labels):
+    return ",".join(f"{k}={v}" for k, v in labels)
+
+def _ms(seconds):
+    return round(seconds * 1000, 3) if seconds is not None else None
+
+def snapshot():
+    with _lock:
+        hists = {k: dict(v, buckets=list(v["buckets"])) for k, v in _histograms.items()}
+        counters, gauges = dict(_counters), dict(_gauges)
+    out = {"time": time.time(), "latency": {}, "counters": {}, "gauges": {}, "collectors": {}}
+    for (name, labels), h in sorted(hists.items()):
+        out["latency"][f"{name}{{{_label_str(labels)}}}" if labels else name] = {
+            "count": h["count"], "mean_ms": round(h["sum"] / h["count"] * 1000, 3) if h["count"] else None,
+            "p50_ms": _ms(_quantile(h, 0.5)), "p90_ms": _ms(_quantile(h, 0.9)), "p99_ms": _ms(_quantile(h, 0.99)),
+            "max_ms": round(h["max"] * 1000, 3), "buckets": h["buckets"]}
+    for (name, labels), v in sorted(counters.items()):
+        out["counters"][f"{name}{{{_label_str(labels)}}}" if labels else name] = v
+    for (name, labels), v in sorted(gauges.items()):
+        out["gauges"][f"{name}{{{_label_str(labels)}}}" if labels else name] = v
+    for name, fn in sorted(_collectors.items()):
+        try: out["collectors"][name] = fn()
+        except Exception as e: log.warning("Metrics collector %s failed: %s", name, e)
+    return out
+
+def _prom_name(name):
+    return "hitster_" + "".join(ch if ch.isalnum() else "_" for ch in name)
+
+def _prom_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items: return ""
+    return "{" + ",".join(f'{k}="{str(v)}"' for k, v in items) + "}"
+
+def prometheus_text():
+    with _lock:
+        hists = {k: dict(v, buckets=list(v["buckets"])) for k, v in _histograms.items()}
+        counters, gauges = dict(_counters), dict(_gauges)
+    lines = []
+    for name in sorted({k[0] for k in hists}):
+        metric = _prom_name(name) + "_seconds"
+        lines.append(f"# TYPE {metric} histogram")
+        for (n, labels), h in sorted(hists.items()):
+            if n != name: continue
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ("+Inf",), h["buckets"]):
+                cumulative += count
+                lines.append(f"{metric}_bucket{_prom_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{metric}_sum{_prom_labels(labels)} {h['sum']:.6f}")
+            lines.append(f"{metric}_count{_prom_labels(labels)} {h['count']}")
+    for (name, labels), v in sorted(counters.items()):
+        lines.append(f"{_prom_name(name)}_total{_prom_labels(labels)} {v}")
+    for (name, labels), v in sorted(gauges.items()):
+        lines.append(f"{_prom_name(name)}{_prom_labels(labels)} {v}")
+    for cname, fn in sorted(_collectors.items()):
+        try: values = fn()
+        except Exception as e:
+            log.warning("Metrics collector %s failed: %s", cname, e)
+            continue
+        for k, v in sorted(values.items()):
+            if isinstance(v, bool) or not isinstance(v, (int, float)): continue
+            lines.append(f"{_prom_name(cname + '_' + k)} {v}")
+    return "\n".join(lines) + "\n"
+
+def export_files(directory=None):
+    # metrics/hitster_metrics.json + metrics/hitster_metrics.prom (atomikus csere, a scraper sosem lát félkész fájlt)
+    directory = directory or METRICS_DIR
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for name, content in (("hitster_metrics.json", json.dumps(snapshot(), indent=2, default=str)),
+                          ("hitster_metrics.prom", prometheus_text())):
+        path = os.path.join(directory, name)
+        with open(path + ".tmp", "w", encoding="utf-8") as f: f.write(content)
+        os.replace(path + ".tmp", path)
+        paths.append(path)
+    return paths
+
+def start_exporter(interval=METRICS_EXPORT_INTERVAL, directory=None):
+    # idempotens: folyamatonként egy háttérszál
+    with _lock:
+        if _exporter["thread"] is not None: return _exporter["thread"]
+        def run():
+            while True:
+                time.sleep(interval)
+                try: export_files(directory)
+                except OSError as e: log.warning("Metrics export failed: %s", e)
+        _exporter["thread"] = threading.Thread(target=run, name="hitster-metrics", daemon=True)
+        _exporter["thread"].start()
+        return _exporter["thread"]
+
+def reset_metrics():
+    with _lock:
+        _histograms.clear(); _counters.clear(); _gauges.clear()
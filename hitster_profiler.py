@@ -0,0 +1,104 @@
+# --- IGÉNY SZERINTI PROFILOZÁS (cProfile) ---
+# Bekapcsolva (?profile=1 vagy a TV admin kapcsolója) minden futás / fragment frissítés egy .prof fájlba kerül
+# a profiles/ mappába, szerep + fázis + verzió címkével; fajtánként (run / az egyes fragmentek) csak az utolsó
+# PROFILE_KEEP marad meg, így a sűrű fragment frissítések nem szorítják ki a teljes futások profiljait.
+# A változás nélküli fragment frissítés (csak verzió lekérdezés) eldobható (discard), ez nem kerül fájlba.
+# Streamlit független: a futás adatait a hívó adja át (pl. st.session_state).
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+log = logging.getLogger(__name__)
+
+PROFILE_DIR = "profiles"
+PROFILE_KEEP = 20
+PROFILE_TOP = 25
+
+_local = threading.local()  # egy szálon egyszerre csak egy cProfile futhat
+_lock = threading.Lock()
+
+def _start(kind, tags):
+    prof = cProfile.Profile()
+    prof.enable()
+    _local.active = True
+    return {"prof": prof, "kind": kind, "tags": dict(tags), "started": time.time(), "t0": time.perf_counter()}
+
+def _finish(run, interrupted=False):
+    run["prof"].disable()
+    _local.active = False
+    if run.get("discard"): return
+    meta = dict(run["tags"], kind=run["kind"], started=run["started"], interrupted=interrupted,
+                duration_ms=round((time.perf_counter() - run["t0"]) * 1000, 2))
+    name = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(run['started']))}-{int(run['started'] * 1000) % 1000:03d}-{run['kind']}"
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"{name}.prof")
+        run["prof"].dump_stats(path)
+        with open(os.path.join(PROFILE_DIR, f"{name}.json"), "w", encoding="utf-8") as f: json.dump(meta, f)
+        _prune(run["kind"])
+    except OSError as e:
+        log.warning("Profile save failed: %s", e)
+
+def _prune(kind, keep=PROFILE_KEEP):
+    # a fájlnév vége a fajta (<dátum>-<idő>-<ms>-<fajta>), csak az azonos fajtájúak versenyeznek a helyekért
+    with _lock:
+        names = sorted(f[:-5] for f in os.listdir(PROFILE_DIR) if f.endswith(".prof") and f[:-5].split("-", 3)[-1] == kind)
+        for old in names[:-keep] if keep else names:
+            for ext in (".prof", ".json"):
+                try: os.remove(os.path.join(PROFILE_DIR, old + ext))
+                except FileNotFoundError: pass
+
+def begin_run(store, enabled, **tags):
+    # a teljes script futás eleje; az st.rerun()-nal megszakított előző futást itt zárjuk le
+    prev = store.pop('_profile_run', None)
+    if prev is not None: _finish(prev, interrupted=True)
+    if not enabled or getattr(_local, "active", False): return None
+    run = _start("run", tags)
+    store['_profile_run'] = run
+    return run
+
+def tag_run(store, **tags):
+    run = store.get('_profile_run')
+    if run is not None: run["tags"].update(tags)
+
+def end_run(store):
+    run = store.pop('_profile_run', None)
+    if run is not None: _finish(run)
+
+@contextmanager
+def profiled(enabled, kind, **tags):
+    # pl. a fragment frissítések; ha a teljes futás profilja már fut (első render), nem ágyazunk bele
+    if not enabled or getattr(_local, "active", False):
+        yield
+        return
+    run = _start(kind, tags)
+    try: yield run
+    finally: _finish(run)
+
+def discard(run):
+    # a profiled() által adott futás ne kerüljön mentésre (pl. a fragment semmit nem csinált)
+    if run is not None: run["discard"] = True
+
+def list_profiles():
+    # legfrissebb elöl
+    if not os.path.isdir(PROFILE_DIR): return []
+    out = []
+    for f in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        if not f.endswith(".json"): continue
+        try:
+            with open(os.path.join(PROFILE_DIR, f), encoding="utf-8") as fh: meta = json.load(fh)
+        except (OSError, ValueError): continue
+        meta["path"] = os.path.join(PROFILE_DIR, f[:-5] + ".prof")
+        if os.path.exists(meta["path"]): out.append(meta)
+    return out
+
+def top_functions(path, limit=PROFILE_TOP, sort="cumulative"):
+    out = io.StringIO()
+    pstats.Stats(path, stream=out).strip_dirs().sort_stats(sort).print_stats(limit)
+    return out.getvalue()
@@ -0,0 +1,61 @@
+# --- IDŐVONAL RENDERELÉS ---
+# Egy idővonal egyetlen HTML blokk (nem kártyánként egy st.columns cella), játékos + idővonal tartalom szerint
+# memoizálva. Hosszú idővonalnál csak egy ablaknyi kártya látszik teljes méretben, a többi összecsukva,
+# így a böngészőnek küldött adat nem nő a pontszámmal.
+import functools
+import html
+
+import hitster_metrics
+from hitster_media import cover_url
+
+TIMELINE_WINDOW = 12         # TV: ennyi teljes kártya egyszerre
+MOBILE_TIMELINE_WINDOW = 20  # telefon: ennyi sor egyszerre
+
+def _more(cards, layout):
+    if not cards: return ""
+    years = f"{cards[0][1]}–{cards[-1][1]}" if len(cards) > 1 else f"{cards[0][1]}"
+    if layout == "mobile": return f"<div class='mob-more'>… {len(cards)} kártya ({years})</div>"
+    return f"<div class='timeline-more'><div class='card-year'>+{len(cards)}</div><div class='card-title'>{years}</div></div>"
+
+@functools.lru_cache(maxsize=512)
+def _timeline_html(player, cards, highlight_id, layout, window):
+    # cards: ((spotify_id, év, cím, borító url), ...) -> a kulcs maga az idővonal állapota
+    start, end = 0, len(cards)
+    if window and len(cards) > window:
+        ids = [c[0] for c in cards]
+        idx = ids.index(highlight_id) if highlight_id in ids else len(cards) // 2
+        start = min(max(idx - window // 2, 0), len(cards) - window)
+        end = start + window
+    parts = [_more(cards[:start], layout)]
+    for spotify_id, year, title, image in cards[start:end]:
+        title, image = html.escape(title), html.escape(image, quote=True)
+        if layout == "mobile":
+            parts.append(f"<div class='mob-card-box'><img src='{image}' loading='lazy'><div><div style='font-weight:bold; font-size:1.2em'>{year}</div><div>{title}</div></div></div>")
+        else:
+            css_class = "timeline-card reveal-highlight" if spotify_id == highlight_id else "timeline-card"
+            parts.append(f"<div class='{css_class}'><img src='{image}' loading='lazy'><div class='card-content'><div class='card-year'>{year}</div><div class='card-title'>{title}</div></div></div>")
+    parts.append(_more(cards[end:], layout))
+    wrapper = "mob-timeline" if layout == "mobile" else "timeline-strip"
+    return f"<div class='{wrapper}'>{''.join(parts)}</div>"
+
+@hitster_metrics.timed("render.timeline")
+def timeline_html(player, timeline, highlight_id=None, layout="tv"):
+    size = "mobile" if layout == "mobile" else "tv"
+    window = MOBILE_TIMELINE_WINDOW if layout == "mobile" else TIMELINE_WINDOW
+    cards = tuple((c['spotify_id'], c['year'], c['title'], cover_url(c, size)) for c in timeline)
+    return _timeline_html(player, cards, highlight_id, layout, window)
+
+def slot_labels(timeline):
+    # a telefonos választó feliratai: n kártyához n+1 hely
+    years = [c['year'] for c in timeline]
+    if not years: return ["⬇️ IDE"]
+    labels = [f"⬆️ Legelejére ({years[0]} elé)"]
+    labels += [f"↕️ {years[i - 1]} és {years[i]} közé" for i in range(1, len(years))]
+    labels.append(f"⬇️ Végére ({years[-1]} után)")
+    return labels
+
+def render_stats():
+    info = _timeline_html.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize}
+
+hitster_metrics.register_collector("render_cache", render_stats)
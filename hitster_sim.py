@@ -0,0 +1,216 @@
+# --- HEADLESS SZIMULÁTOR & BENCHMARK ---
+# Teljes játékokat játszik le böngésző, Spotify és Groq nélkül, a valódi hitster_db / hitster_engine kóddal.
+#
+#   python hitster_sim.py --games 1000 --players 4 --deck 80 --target 10 --guesser random
+#   python hitster_sim.py --bench --json bench.json
+import argparse
+import bisect
+import json
+import os
+import random
+import tempfile
+import time
+
+import hitster_db
+from hitster_engine import current_player, deal_game, resolve_turn, advance_round, mark_sound_played
+
+# --- HELYI HELYETTESÍTŐK (load_spotify_tracks / fix_card_with_groq_cached / get_fun_fact_cached) ---
+def fake_spotify_tracks(limit=80, rng=None, min_year=1950, max_year=2024):
+    rng = rng or random.Random()
+    return [{
+        "artist": f"Előadó {i % 37}", "title": f"Dal {i}", "year": rng.randint(min_year, max_year),
+        "spotify_id": f"sim{i:05d}", "image": f"https://example.invalid/cover/{i}.jpg"
+    } for i in range(limit)]
+
+def fake_fix_card(card, rng, fix_rate=0.1, latency=0.0):
+    if latency: time.sleep(latency)
+    if rng.random() < fix_rate:
+        card['year'] = max(1901, card['year'] - rng.randint(1, 15))
+        card['fixed_by_ai'] = True
+    return card
+
+def fake_fun_fact(artist, title, latency=0.0):
+    if latency: time.sleep(latency)
+    return f"{artist} - {title}: szimulált érdekesség."
+
+# --- TIPPELŐK ---
+def correct_pos(timeline, song):
+    return bisect.bisect_right([c['year'] for c in timeline], song['year'])
+
+def make_guesser(kind, rng, accuracy=0.5, script=None):
+    if kind == "perfect":
+        return lambda timeline, song: correct_pos(timeline, song)
+    if kind == "random":
+        return lambda timeline, song: rng.randint(0, len(timeline))
+    if kind == "accuracy":
+        return lambda timeline, song: correct_pos(timeline, song) if rng.random() < accuracy else rng.randint(0, len(timeline))
+    if kind == "scripted":
+        steps = [int(x) for x in (script or "0").split(",")]
+        counter = {"i": 0}
+        def scripted(timeline, song):
+            pos = steps[counter["i"] % len(steps)]
+            counter["i"] += 1
+            return min(max(pos, 0), len(timeline))
+        return scripted
+    raise ValueError(f"ismeretlen tippelő: {kind}")
+
+# --- MÉRÉS ---
+class OpStats:
+    def __init__(self):
+        self.samples = {}
+
+    def timed(self, name, fn, *args, **kwargs):
+        t0 = time.perf_counter()
+        try: return fn(*args, **kwargs)
+        finally: self.samples.setdefault(name, []).append(time.perf_counter() - t0)
+
+    def summary(self):
+        out = {}
+        for name, xs in sorted(self.samples.items()):
+            xs = sorted(xs)
+            pct = lambda p: xs[min(len(xs) - 1, int(p * len(xs)))] * 1000
+            out[name] = {"count": len(xs), "mean_ms": sum(xs) / len(xs) * 1000,
+                         "p50_ms": pct(0.50), "p90_ms": pct(0.90), "p99_ms": pct(0.99), "max_ms": xs[-1] * 1000}
+        return out
+
+# --- EGY JÁTÉK ---
+def play_game(room_id, players, deck_size, target_score, guesser, rng, stats, ai_latency=0.0):
+    update = lambda name, fn, **kw: stats.timed(name, hitster_db.update_state, room_id, fn, **kw)
+
+    stats.timed("reset_db", hitster_db.reset_db, room_id)
+    for p in players:
+        def add_player(s, p=p):
+            if s['game_phase'] != "LOBBY" or p in s['players']: return False
+            s['players'].append(p)
+        update("add_player", add_player, event="player_added")
+
+    deck = fake_spotify_tracks(deck_size, rng)
+    rng.shuffle(deck)
+    dealt = deal_game(list(players), deck, target_score=target_score, fix_card=lambda c: fake_fix_card(c, rng, latency=ai_latency))
+    def start_game(s):
+        if s['game_phase'] != "LOBBY": return False
+        dealt['version'] = s['version']
+        s.clear(); s.update(dealt)
+    update("start_game", start_game, event="game_started")
+
+    turns = 0
+    while True:
+        state = stats.timed("load_state", hitster_db.load_state, room_id)
+        phase = state.get('game_phase')
+        if phase == "GUESSING":
+            me = current_player(state)
+            song = state['current_mystery_song']
+            pos = guesser(state['timelines'][me], song)
+            fun_fact = fake_fun_fact(song['artist'], song['title'], latency=ai_latency)
+            def apply_guess(s):
+                if s['current_mystery_song']['spotify_id'] != song['spotify_id']: return False
+                return resolve_turn(s, me, pos, fun_fact)
+            update("guess", apply_guess, event="guess_made")
+            turns += 1
+        elif phase == "REVEAL":
+            # a TV: verzió figyelés, hang lejátszva jelzés, majd következő kör
+            stats.timed("load_state_version", hitster_db.load_state_version, room_id)
+            # ugyanazok a mutátorok, mint a TV-n (hitster_engine)
+            played_trigger, round_turn = state.get('sound_trigger'), state['turn_index']
+            update("sound_played", lambda s: mark_sound_played(s, played_trigger), bump_version=False, event="sound_played")
+            update("next_round", lambda s: advance_round(s, turn_index=round_turn), event="round_advanced")
+        else:
+            return {"turns": turns, "phase": phase, "winner": state.get('winner')}
+
+def run_simulation(games=100, players=4, deck=80, target=10, guesser="random", accuracy=0.5,
+                   script=None, seed=1, db_file=None, ai_latency=0.0, backend=None, flush_interval=None):
+    rng = random.Random(seed)
+    tmp = None
+    if not db_file:
+        tmp = tempfile.mkdtemp(prefix="hitster_sim_")
+        db_file = os.path.join(tmp, "sim.db")
+    hitster_db.set_db_file(db_file)  # előbb a fájl, hogy a motor egyszer, már az új fájlra épüljön fel
+    hitster_db.set_state_backend(backend, flush_interval)
+    room_id = f"sim-{seed}"
+    hitster_db.init_db(room_id)
+
+    names = [f"J{i + 1}" for i in range(players)]
+    guess_fn = make_guesser(guesser, rng, accuracy=accuracy, script=script)
+    stats = OpStats()
+    writes_before = dict(hitster_db.get_write_stats())
+    txn_before = dict(hitster_db.get_txn_stats())
+    journal_before = hitster_db.journal_stats()
+
+    results = []
+    t0 = time.perf_counter()
+    for _ in range(games):
+        results.append(play_game(room_id, names, deck, target, guess_fn, rng, stats, ai_latency=ai_latency))
+    elapsed = time.perf_counter() - t0
+    hitster_db.flush_state()  # memória motor: a write-behind maradéka is számítson az írásokba
+
+    writes = {k: hitster_db.get_write_stats()[k] - writes_before[k] for k in writes_before}
+    txn = {k: hitster_db.get_txn_stats()[k] - txn_before[k] for k in txn_before}
+    journal = hitster_db.journal_stats()
+    turns = sum(r['turns'] for r in results) or 1
+    return {
+        "config": {"games": games, "players": players, "deck": deck, "target": target, "guesser": guesser,
+                   "accuracy": accuracy, "seed": seed, "ai_latency": ai_latency, "backend": hitster_db.get_state_store().name},
+        "games": games,
+        "turns": turns,
+        "elapsed_s": elapsed,
+        "turns_per_sec": turns / elapsed if elapsed else 0.0,
+        "victories": sum(1 for r in results if r['phase'] == "VICTORY"),
+        "game_overs": sum(1 for r in results if r['phase'] == "GAME_OVER"),
+        "avg_turns_per_game": turns / max(games, 1),
+        "bytes_written_per_turn": writes["bytes"] / turns,
+        "rows_written_per_turn": writes["rows"] / turns,
+        "journal_bytes_per_turn": (journal["written_event_bytes"] - journal_before["written_event_bytes"]) / turns,
+        "journal_snapshots": journal["written_snapshots"] - journal_before["written_snapshots"],
+        "txn": txn,
+        "ops": stats.summary(),
+    }
+
+BENCH_MATRIX = [
+    {"players": 2, "deck": 50, "target": 10},
+    {"players": 4, "deck": 80, "target": 10},
+    {"players": 8, "deck": 200, "target": 10},
+    {"players": 8, "deck": 200, "target": 25},
+]
+
+def print_report(r):
+    c = r['config']
+    print(f"\n== {r['games']} játék | {c['players']} játékos | pakli {c['deck']} | cél {c['target']} | {c['guesser']} | {c['backend']} ==")
+    print(f"körök: {r['turns']}  ({r['avg_turns_per_game']:.1f}/játék)   idő: {r['elapsed_s']:.2f}s   {r['turns_per_sec']:.0f} kör/s")
+    print(f"győzelem: {r['victories']}  elfogyott pakli: {r['game_overs']}")
+    print(f"írás / kör: {r['bytes_written_per_turn']:.0f} bájt, {r['rows_written_per_turn']:.1f} sor   tranzakciók: {r['txn']}")
+    print(f"napló / kör: {r['journal_bytes_per_turn']:.0f} bájt   snapshotok: {r['journal_snapshots']}")
+    print(f"{'művelet':<20}{'db':>8}{'átlag':>10}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}  (ms)")
+    for name, s in r['ops'].items():
+        print(f"{name:<20}{s['count']:>8}{s['mean_ms']:>10.3f}{s['p50_ms']:>10.3f}{s['p90_ms']:>10.3f}{s['p99_ms']:>10.3f}{s['max_ms']:>10.3f}")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Hitster headless szimulátor és benchmark")
+    ap.add_argument("--games", type=int, default=200)
+    ap.add_argument("--players", type=int, default=4)
+    ap.add_argument("--deck", type=int, default=80)
+    ap.add_argument("--target", type=int, default=10)
+    ap.add_argument("--guesser", choices=["random", "perfect", "accuracy", "scripted"], default="random")
+    ap.add_argument("--accuracy", type=float, default=0.5, help="--guesser accuracy: helyes tipp valószínűsége")
+    ap.add_argument("--script", help="--guesser scripted: pozíciók vesszővel, körkörösen (pl. 0,1,0,2)")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--db", help="SQLite fájl (alapból ideiglenes)")
+    ap.add_argument("--ai-latency", type=float, default=0.0, help="szimulált Groq késleltetés (mp)")
+    ap.add_argument("--backend", choices=["sqlite", "memory"], help="állapot tároló (alapból HITSTER_STATE_BACKEND / sqlite)")
+    ap.add_argument("--flush-interval", type=float, help="memory: write-behind periódus (mp), 0 = nincs kiírás")
+    ap.add_argument("--bench", action="store_true", help="a beépített BENCH_MATRIX lefuttatása")
+    ap.add_argument("--json", help="eredmények mentése JSON-ba")
+    args = ap.parse_args(argv)
+
+    configs = BENCH_MATRIX if args.bench else [{"players": args.players, "deck": args.deck, "target": args.target}]
+    results = []
+    for cfg in configs:
+        r = run_simulation(games=args.games, guesser=args.guesser, accuracy=args.accuracy, script=args.script,
+                           seed=args.seed, db_file=args.db, ai_latency=args.ai_latency, backend=args.backend,
+                           flush_interval=args.flush_interval, **cfg)
+        print_report(r)
+        results.append(r)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f: json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+# --- 3/A. SPOTIFY BETÖLTÉS (folyamatos, oldalanként) ---
+# Az első oldal után már indulhat a játék, a pakli többi része a háttérben töltődik fel.
+# A betöltött listák helyben megmaradnak; playlistnél a snapshot_id dönti el, hogy frissíteni kell-e
+# (vak TTL helyett), az album tartalma pedig nem változik.
+import json
+import logging
+import random
+import threading
+import time
+
+import hitster_catalog
+import hitster_clients
+import hitster_db
+import hitster_metrics
+from hitster_media import PLACEHOLDER_IMAGE
+
+log = logging.getLogger(__name__)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS playlist_cache (
+    source_key TEXT PRIMARY KEY, snapshot_id TEXT, complete INTEGER NOT NULL DEFAULT 0,
+    tracks TEXT NOT NULL, fetched_at REAL NOT NULL
+);
+'''
+
+def _connection():
+    return hitster_db.schema_connection(SCHEMA)
+
+def parse_source(playlist_url):
+    if "?" in playlist_url: clean_url = playlist_url.split("?")[0]
+    else: clean_url = playlist_url
+    resource_id = clean_url.rstrip("/").split("/")[-1]
+    if "album" in clean_url: return "album", resource_id
+    if "playlist" in clean_url: return "playlist", resource_id
+    return None, resource_id
+
+def get_image(item_obj):
+    try: return item_obj['images'][0]['url']
+    except (KeyError, IndexError, TypeError): return PLACEHOLDER_IMAGE
+
+def _album_cards(items, year, img_url):
+    return [{"artist": t['artists'][0]['name'], "title": t['name'], "year": year,
+             "spotify_id": t['id'], "image": img_url} for t in items]
+
+def _playlist_cards(items):
+    cards = []
+    for item in items:
+        t = item.get('track')
+        if t and t.get('album') and t['album'].get('release_date'):
+            cards.append({"artist": t['artists'][0]['name'], "title": t['name'], "year": int(t['album']['release_date'][:4]),
+                          "spotify_id": t['id'], "image": get_image(t['album'])})
+    return cards
+
+def _cached_source(source_key):
+    with _connection() as conn:
+        row = conn.execute("SELECT snapshot_id, complete, tracks FROM playlist_cache WHERE source_key = ?", (source_key,)).fetchone()
+    return (row[0], bool(row[1]), json.loads(row[2])) if row else None
+
+def _store_source(source_key, snapshot_id, complete, tracks):
+    with _connection() as conn:
+        conn.execute("INSERT OR REPLACE INTO playlist_cache (source_key, snapshot_id, complete, tracks, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                     (source_key, snapshot_id, int(complete), json.dumps(tracks), time.time()))
+
+def _pages(sp, kind, resource_id):
+    # kártya-listákat ad oldalanként; minden oldal lekérése a "spotify" párhuzamossági korlát alatt fut
+    pages = _raw_pages(sp, kind, resource_id)
+    while True:
+        with hitster_clients.upstream("spotify"):
+            page = next(pages, None)
+        if page is None: return
+        hitster_metrics.inc("spotify_pages")
+        yield page
+
+def _raw_pages(sp, kind, resource_id):
+    if kind == "album":
+        album_info = sp.album(resource_id)
+        year = int(album_info['release_date'][:4])
+        img_url = get_image(album_info)
+        results = sp.album_tracks(resource_id)
+        yield _album_cards(results['items'], year, img_url)
+        while results['next']:
+            results = sp.next(results)
+            yield _album_cards(results['items'], year, img_url)
+    else:
+        results = sp.playlist_items(resource_id)
+        yield _playlist_cards(results['items'])
+        while results['next']:
+            results = sp.next(results)
+            yield _playlist_cards(results['items'])
+
+def source_key_for(playlist_url):
+    kind, resource_id = parse_source(playlist_url)
+    return f"{kind}:{resource_id}" if kind else None
+
+@hitster_metrics.timed("spotify.open_track_stream")
+def open_track_stream(api_id, api_secret, playlist_url, limit=80, min_first=1):
+    # (első_kártyák, további_oldalak) -> a további oldalak generátora None, ha minden megvan már
+    # min_first: legalább ennyi kártyát betöltünk szinkron (a kiosztáshoz kell)
+    # Minden kártya a helyi katalógusba kerül, és onnan jön vissza (id-vel, a már javított évvel).
+    kind, resource_id = parse_source(playlist_url)
+    if not api_id or not api_secret or not kind: return [], None
+    source_key = f"{kind}:{resource_id}"
+    ingest = lambda cards: hitster_catalog.add_tracks(cards, source_key)
+    cached = _cached_source(source_key)
+    try:
+        # a kulcsonként közös kliens (a spotipy csak itt, a TV lobbyban töltődik be) tartja a tokent és a kapcsolatot;
+        # az egyszerre indított azonos lista ellenőrzések egy kérésen osztoznak
+        sp = hitster_clients.spotify_client(api_id, api_secret)
+        def snapshot():
+            with hitster_clients.upstream("spotify"):
+                return sp.playlist(resource_id, fields="snapshot_id")['snapshot_id']
+        snapshot_id = hitster_clients.single_flight(("spotify", "snapshot", api_id, resource_id), snapshot) if kind == "playlist" else None
+    except Exception as e:
+        log.warning("Spotify unavailable (%s), using cached tracks: %s", source_key, e)
+        hitster_metrics.inc("spotify_errors")
+        return ingest(cached[2][:limit] if cached else []), None
+
+    if cached and cached[0] == snapshot_id and (cached[1] or len(cached[2]) >= limit):
+        hitster_metrics.inc("spotify_playlist_cache", result="hit")
+        return ingest(cached[2][:limit]), None
+
+    hitster_metrics.inc("spotify_playlist_cache", result="miss")
+    pages = _pages(sp, kind, resource_id)
+    first = []
+    try:
+        while len(first) < max(min_first, 1):
+            first.extend(next(pages))
+    except StopIteration:
+        _store_source(source_key, snapshot_id, True, first)
+        return ingest(first[:limit]), None
+    except Exception as e:
+        log.warning("Spotify load failed (%s): %s", source_key, e)
+        hitster_metrics.inc("spotify_errors")
+        return ingest(cached[2][:limit] if cached else first[:limit]), None
+    if len(first) >= limit:
+        _store_source(source_key, snapshot_id, False, first)
+        return ingest(first[:limit]), None
+
+    def more():
+        loaded = list(first)
+        complete = False
+        try:
+            for page in pages:
+                page = page[:limit - len(loaded)]
+                loaded.extend(page)
+                yield ingest(page)
+                if len(loaded) >= limit: break
+            else: complete = True
+        except Exception as e:
+            log.warning("Spotify paging stopped (%s): %s", source_key, e)
+            hitster_metrics.inc("spotify_errors")
+            return
+        _store_source(source_key, snapshot_id, complete, loaded)
+    return ingest(first), more()
+
+def fill_deck_async(room_id, game_id, more_pages, on_page=None):
+    # A háttérben oldalanként a pakliba keveri az új kártyák katalógus id-jét (append + csere egy véletlen hellyel,
+    # így a pakli egyenletesen kevert marad, és a delta írás kártyánként csak két sort érint)
+    def run():
+        game_over = []
+        for page in more_pages:
+            if not page: continue
+            def add_cards(s, page=page):
+                if s.get('game_id') != game_id or s.get('game_phase') not in ("GUESSING", "REVEAL"):
+                    game_over.append(True)
+                    return False
+                known = set(s['deck'])
+                known.update(c.get('id') for tl in s['timelines'].values() for c in tl)
+                if s.get('current_mystery_song'): known.add(s['current_mystery_song'].get('id'))
+                fresh = [c['id'] for c in page if c['id'] not in known and not known.add(c['id'])]
+                if not fresh: return False
+                for track_id in fresh:
+                    s['deck'].append(track_id)
+                    j = random.randrange(len(s['deck']))
+                    s['deck'][j], s['deck'][-1] = s['deck'][-1], s['deck'][j]
+            if hitster_db.update_state(room_id, add_cards, bump_version=False, event="deck_extended") is None:
+                if game_over: return
+                continue
+            if on_page: on_page(page)
+    thread = threading.Thread(target=run, name=f"hitster-deck-{room_id}", daemon=True)
+    thread.start()
+    return thread
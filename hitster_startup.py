@@ -0,0 +1,83 @@
+# --- INDULÁSI IDŐ BENCHMARK (szerepenként) ---
+# A valódi hitster_app.py-t futtatja a Streamlit AppTest-tel, szerepenként külön, friss Python folyamatban:
+#   hideg indulás: az első munkamenet (modul importok + első futás), ahogy egy frissen indult szerveren
+#   meleg indulás: minden további új munkamenet (pl. a QR kódot egyszerre beszkennelő telefonok)
+# és kiírja, hogy a nehéz csomagok (spotipy, groq, qrcode) betöltődtek-e az adott szerephez.
+#
+#   python hitster_startup.py --runs 10
+#   python hitster_startup.py --role player --json startup.json
+import argparse
+import importlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+APP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "hitster_app.py")
+ROLES = ("tv", "player")
+HEAVY_MODULES = ("spotipy", "groq", "qrcode")
+BENCH_ROOM = "BENCH"
+
+def _percentile(xs, p):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(p * len(xs)))] if xs else None
+
+def _session(role, timeout):
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(APP_FILE, default_timeout=timeout)
+    at.query_params["role"] = role
+    at.query_params["room"] = BENCH_ROOM
+    for key in ("SPOTIFY_ID", "SPOTIFY_SECRET", "GROQ_KEY"): at.secrets[key] = ""  # kulcsok nélkül: nincs hálózati hívás
+    t0 = time.perf_counter()
+    at.run()
+    elapsed = time.perf_counter() - t0
+    if at.exception: raise RuntimeError(f"{role}: {at.exception[0].message}")
+    return elapsed
+
+def measure_role(role, runs=5, timeout=30):
+    # a gyerek folyamatban fut: a Streamlit maga már be van töltve (a szerveren is az), az app moduljai még nem
+    importlib.import_module("streamlit.testing.v1")
+    before = set(sys.modules)
+    t0 = time.perf_counter()
+    _session(role, timeout)
+    cold = time.perf_counter() - t0
+    loaded = set(sys.modules) - before
+    warm = [_session(role, timeout) for _ in range(runs)]
+    return {"role": role, "cold_ms": cold * 1000, "warm_p50_ms": _percentile(warm, 0.5) * 1000,
+            "warm_max_ms": max(warm) * 1000, "runs": runs, "modules_loaded": len(loaded),
+            "heavy": [m for m in HEAVY_MODULES if m in loaded]}
+
+def run_child(role, runs, timeout):
+    # minden szerep saját folyamatban és saját (ideiglenes) adatbázissal fut, hogy a hideg indulás valódi legyen
+    with tempfile.TemporaryDirectory(prefix="hitster_startup_") as tmp:
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", role, "--runs", str(runs), "--timeout", str(timeout)],
+                             cwd=tmp, capture_output=True, text=True, check=False)
+    if out.returncode != 0: raise RuntimeError(f"{role}: {out.stderr.strip().splitlines()[-1] if out.stderr.strip() else out.returncode}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def print_report(results):
+    print(f"{'szerep':<8}{'hideg':>10}{'meleg p50':>12}{'meleg max':>12}{'modulok':>10}  nehéz csomagok  (ms)")
+    for r in results:
+        print(f"{r['role']:<8}{r['cold_ms']:>10.1f}{r['warm_p50_ms']:>12.1f}{r['warm_max_ms']:>12.1f}{r['modules_loaded']:>10}  {', '.join(r['heavy']) or '-'}")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Hitster indulási idő benchmark szerepenként")
+    ap.add_argument("--role", choices=ROLES, help="csak ez a szerep (alapból mind)")
+    ap.add_argument("--runs", type=int, default=5, help="meleg munkamenetek száma szerepenként")
+    ap.add_argument("--timeout", type=float, default=30)
+    ap.add_argument("--json", help="eredmények mentése JSON-ba")
+    ap.add_argument("--child", choices=ROLES, help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(measure_role(args.child, runs=args.runs, timeout=args.timeout)))
+        return
+    results = [run_child(role, args.runs, args.timeout) for role in ([args.role] if args.role else ROLES)]
+    print_report(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f: json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
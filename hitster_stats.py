@@ -0,0 +1,129 @@
+# --- JÁTÉKOKON ÁTÍVELŐ STATISZTIKÁK ---
+# Minden tipp eredménye (ki, melyik dal, talált-e) egy sor a stats_turns táblában, és ugyanabban a
+# tranzakcióban nőnek az összesítők is (játékos, játékos x évtized, dal). A ranglista / évtized pontosság /
+# legnehezebb dalok így kis, előre összesített táblákból jönnek, a teljes történet végigolvasása nélkül.
+# A játék vége (győzelem / elfogyott pakli) egyszer kerül be, ekkor nő a játékosok játék / győzelem száma.
+import json
+import time
+
+import hitster_db
+import hitster_metrics
+
+HARDEST_MIN_GUESSES = 2  # ennél kevesebb tippnél egy dal nehézsége még nem mond semmit
+LEADERBOARD_SIZE = 10
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS stats_turns (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, game_id TEXT NOT NULL, room_id TEXT, player TEXT NOT NULL,
+    spotify_id TEXT NOT NULL, decade INTEGER, success INTEGER NOT NULL, created_at REAL NOT NULL,
+    UNIQUE (game_id, spotify_id)
+);
+CREATE TABLE IF NOT EXISTS stats_games (
+    game_id TEXT PRIMARY KEY, room_id TEXT, outcome TEXT NOT NULL, winner TEXT, players TEXT NOT NULL,
+    turns INTEGER NOT NULL, ended_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stats_players (
+    player TEXT PRIMARY KEY, games INTEGER NOT NULL DEFAULT 0, wins INTEGER NOT NULL DEFAULT 0,
+    guesses INTEGER NOT NULL DEFAULT 0, correct INTEGER NOT NULL DEFAULT 0, last_played REAL
+);
+CREATE INDEX IF NOT EXISTS idx_stats_players_wins ON stats_players (wins DESC, correct DESC);
+CREATE TABLE IF NOT EXISTS stats_player_decades (
+    player TEXT NOT NULL, decade INTEGER NOT NULL, guesses INTEGER NOT NULL DEFAULT 0, correct INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (player, decade)
+);
+CREATE TABLE IF NOT EXISTS stats_songs (
+    spotify_id TEXT PRIMARY KEY, artist TEXT, title TEXT, year INTEGER,
+    guesses INTEGER NOT NULL DEFAULT 0, correct INTEGER NOT NULL DEFAULT 0, difficulty REAL NOT NULL DEFAULT 0.5
+);
+CREATE INDEX IF NOT EXISTS idx_stats_songs_difficulty ON stats_songs (difficulty DESC);
+'''
+
+def _connection():
+    return hitster_db.schema_connection(SCHEMA)
+
+# --- ÍRÁS (a tipp / a játék vége után, egyszer; az ismétlés nem számít kétszer) ---
+@hitster_metrics.timed("stats.record_turn")
+def record_turn(state, player, room_id=None):
+    # state: a tipp utáni állapot (update_state eredménye): last_revealed_song + success
+    song, game_id = state.get('last_revealed_song'), state.get('game_id')
+    if not song or not game_id: return False
+    success = int(bool(state.get('success')))
+    decade = song['year'] // 10 * 10
+    now = time.time()
+    with _connection() as conn:
+        cur = conn.execute("INSERT OR IGNORE INTO stats_turns (game_id, room_id, player, spotify_id, decade, success, created_at) "
+                           "VALUES (?, ?, ?, ?, ?, ?, ?)", (game_id, room_id, player, song['spotify_id'], decade, success, now))
+        if cur.rowcount == 0: return False
+        conn.execute('''INSERT INTO stats_players (player, guesses, correct, last_played) VALUES (?, 1, ?, ?)
+                        ON CONFLICT(player) DO UPDATE SET guesses = guesses + 1, correct = correct + excluded.correct,
+                        last_played = excluded.last_played''', (player, success, now))
+        conn.execute('''INSERT INTO stats_player_decades (player, decade, guesses, correct) VALUES (?, ?, 1, ?)
+                        ON CONFLICT(player, decade) DO UPDATE SET guesses = guesses + 1, correct = correct + excluded.correct''',
+                     (player, decade, success))
+        # nehézség: a tévesztések aránya, kis mintára simítva ((hibák + 1) / (tippek + 2))
+        conn.execute('''INSERT INTO stats_songs (spotify_id, artist, title, year, guesses, correct, difficulty)
+                        VALUES (?, ?, ?, ?, 1, ?, (2.0 - ?) / 3)
+                        ON CONFLICT(spotify_id) DO UPDATE SET guesses = guesses + 1, correct = correct + excluded.correct,
+                        year = excluded.year, difficulty = (guesses + 1.0 - correct - excluded.correct + 1) / (guesses + 1 + 2)''',
+                     (song['spotify_id'], song.get('artist'), song.get('title'), song['year'], success, success))
+    return True
+
+def record_game_end(state, room_id=None):
+    if state.get('game_phase') not in ("VICTORY", "GAME_OVER") or not state.get('game_id'): return False
+    players, winner, now = state.get('players', []), state.get('winner'), time.time()
+    with _connection() as conn:
+        turns = conn.execute("SELECT count(*) FROM stats_turns WHERE game_id = ?", (state['game_id'],)).fetchone()[0]
+        cur = conn.execute("INSERT OR IGNORE INTO stats_games (game_id, room_id, outcome, winner, players, turns, ended_at) "
+                           "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                           (state['game_id'], room_id, state['game_phase'], winner, json.dumps(players), turns, now))
+        if cur.rowcount == 0: return False
+        conn.executemany('''INSERT INTO stats_players (player, games, wins, last_played) VALUES (?, 1, ?, ?)
+                            ON CONFLICT(player) DO UPDATE SET games = games + 1, wins = wins + excluded.wins,
+                            last_played = excluded.last_played''', [(p, int(p == winner), now) for p in players])
+    return True
+
+# --- OLVASÁS (csak az összesítő táblák) ---
+def leaderboard(limit=LEADERBOARD_SIZE):
+    with _connection() as conn:
+        rows = conn.execute("SELECT player, games, wins, guesses, correct FROM stats_players WHERE games > 0 "
+                            "ORDER BY wins DESC, correct DESC LIMIT ?", (limit,)).fetchall()
+    return [{"player": p, "games": g, "wins": w, "win_rate": w / g if g else None, "guesses": n,
+             "accuracy": c / n if n else None} for p, g, w, n, c in rows]
+
+def decade_accuracy(players=None):
+    # évtizedenkénti találati arány (a megadott játékosokra, vagy mindenkire)
+    sql, args = "SELECT decade, SUM(guesses), SUM(correct) FROM stats_player_decades", []
+    if players:
+        sql += f" WHERE player IN ({','.join('?' * len(players))})"
+        args = list(players)
+    with _connection() as conn:
+        rows = conn.execute(sql + " GROUP BY decade ORDER BY decade", args).fetchall()
+    return [{"decade": d, "guesses": n, "accuracy": c / n if n else None} for d, n, c in rows]
+
+def hardest_songs(limit=LEADERBOARD_SIZE, min_guesses=HARDEST_MIN_GUESSES):
+    with _connection() as conn:
+        rows = conn.execute("SELECT spotify_id, artist, title, year, guesses, correct, difficulty FROM stats_songs "
+                            "WHERE guesses >= ? ORDER BY difficulty DESC LIMIT ?", (min_guesses, limit)).fetchall()
+    return [{"spotify_id": s, "artist": a, "title": t, "year": y, "guesses": n, "correct": c, "difficulty": d}
+            for s, a, t, y, n, c, d in rows]
+
+def song_difficulty(spotify_ids):
+    # {spotify_id: nehézség 0..1}; amit még senki nem tippelt, az kimarad (a hívó 0.5-öt feltételez)
+    spotify_ids = list(dict.fromkeys(spotify_ids))
+    found = {}
+    with _connection() as conn:
+        for i in range(0, len(spotify_ids), 500):
+            chunk = spotify_ids[i:i + 500]
+            found.update(conn.execute(f"SELECT spotify_id, difficulty FROM stats_songs WHERE spotify_id IN ({','.join('?' * len(chunk))})",
+                                      chunk).fetchall())
+    return found
+
+def stats_summary():
+    with _connection() as conn:
+        turns = conn.execute("SELECT count(*) FROM stats_turns").fetchone()[0]
+        games = conn.execute("SELECT count(*) FROM stats_games").fetchone()[0]
+        players = conn.execute("SELECT count(*) FROM stats_players").fetchone()[0]
+        songs = conn.execute("SELECT count(*) FROM stats_songs").fetchone()[0]
+    return {"turns": turns, "games": games, "players": players, "songs": songs}
+
+hitster_metrics.register_collector("stats", stats_summary)
@@ -0,0 +1,129 @@
+# --- ÁLLAPOT TÁROLÓ MOTOROK ---
+# A hitster_db publikus függvényei (init_db, load_state, load_state_version, update_state, evict_idle_rooms)
+# a kiválasztott motorra hívnak tovább. Egy motor ezeket tudja (írni csak az update CAS útján lehet):
+#   init_room(room_id)                      szoba létrehozása / betöltése
+#   load(room_id, fresh=False)              állapot (fresh=False: közös példány, CSAK OLVASÁSRA)
+#   version(room_id)                        (version, rev) vagy None
+#   update(room_id, mutate, bump_version, max_retries, event)  -> új állapot vagy None (noop / sikertelen)
+#   evict(max_idle, keep=())                tétlen szobák törlése (keep kivételével), a törölt szobák id-i
+#   txn_stats                               {"commits", "conflicts", "retries", "noops", "failed"}
+# Az SQLite motor a hitster_db-ben van; itt a memóriában tartott, egy folyamatos telepítésekhez való motor.
+import atexit
+import copy
+import logging
+import threading
+import time
+
+from hitster_engine import new_game_state
+
+log = logging.getLogger(__name__)
+
+class MemoryStateStore:
+    # Folyamaton belüli, szálbiztos tároló: szobánként egy zár alatt fut a mutátor (nincs ütközés, nincs
+    # újrapróbálás), nincs lemez I/O és JSON a kérés útján. persist (pl. az SQLite motor) esetén a változott
+    # szobák flush_interval mp-enként a háttérben kiíródnak (write-behind), és induláskor onnan töltődnek vissza;
+    # a két kiírás közti változások egy naplóeseménybe olvadnak. Több szerver folyamat esetén nem használható.
+    name = "memory"
+
+    def __init__(self, persist=None, flush_interval=2.0):
+        self.persist = persist
+        self.flush_interval = flush_interval
+        self.txn_stats = {"commits": 0, "conflicts": 0, "retries": 0, "noops": 0, "failed": 0}
+        self.stats = {"loaded": 0, "flushes": 0, "flushed_rooms": 0, "flush_errors": 0}
+        self._rooms = {}  # room_id -> {"lock", "state", "rev", "updated", "dirty", "event"}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        if persist is not None and flush_interval:
+            self._thread = threading.Thread(target=self._flush_loop, name="hitster-store-flush", daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def _room(self, room_id):
+        room = self._rooms.get(room_id)
+        if room is not None: return room
+        with self._lock:
+            room = self._rooms.get(room_id)
+            if room is None:
+                state = self.persist.restore(room_id) if self.persist is not None else None
+                if state is not None: self.stats["loaded"] += 1
+                room = self._rooms[room_id] = {"lock": threading.Lock(), "state": state or new_game_state(), "rev": 0,
+                                               "updated": time.time(), "dirty": state is None, "event": "room_created"}
+            return room
+
+    def init_room(self, room_id):
+        self._room(room_id)
+
+    def load(self, room_id, fresh=False):
+        state = self._room(room_id)["state"]
+        return copy.deepcopy(state) if fresh else state
+
+    def version(self, room_id):
+        room = self._room(room_id)
+        return room["state"].get('version', 0), room["rev"]
+
+    def _commit(self, room, state, event):
+        # a tárolt állapotot sosem módosítjuk helyben, mindig lecseréljük (a kiadott példányok így olvashatók maradnak)
+        room["state"] = state
+        room["rev"] += 1
+        room["updated"] = time.time()
+        room["dirty"] = True
+        room["event"] = event
+        self.txn_stats["commits"] += 1
+
+    def update(self, room_id, mutate, bump_version=True, max_retries=0, event="state_patched"):
+        room = self._room(room_id)
+        with room["lock"]:
+            work = copy.deepcopy(room["state"])
+            if mutate(work) is False:
+                self.txn_stats["noops"] += 1
+                return None
+            if bump_version: work['version'] = room["state"].get('version', 0) + 1
+            self._commit(room, work, event)
+            return work
+
+    def evict(self, max_idle, keep=()):
+        cutoff = time.time() - max_idle
+        with self._lock:
+            idle = [rid for rid, room in self._rooms.items() if room["updated"] < cutoff and rid not in keep]
+        if idle: self.flush(idle)
+        with self._lock:
+            for rid in idle: self._rooms.pop(rid, None)
+            live = set(self._rooms) | set(keep)
+        if self.persist is not None: idle = sorted(set(idle) | set(self.persist.evict(max_idle, keep=live)))
+        return idle
+
+    def flush(self, room_ids=None):
+        # a változott szobák kiírása; a lemez I/O a szoba zárján kívül fut
+        if self.persist is None: return 0
+        written = 0
+        for room_id in list(room_ids or self._rooms):
+            room = self._rooms.get(room_id)
+            if room is None: continue
+            with room["lock"]:
+                if not room["dirty"]: continue
+                state, event = room["state"], room["event"]
+                room["dirty"] = False
+            try:
+                self.persist.persist(room_id, state, event)
+                written += 1
+            except Exception as e:
+                log.warning("State write-behind failed (%s): %s", room_id, e)
+                self.stats["flush_errors"] += 1
+                with room["lock"]: room["dirty"] = True
+        if written:
+            self.stats["flushes"] += 1
+            self.stats["flushed_rooms"] += written
+        return written
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        self._stop.set()
+        self.flush()
+
+    def store_stats(self):
+        return dict(self.stats, backend=self.name, rooms=len(self._rooms),
+                    dirty=sum(1 for room in list(self._rooms.values()) if room["dirty"]))